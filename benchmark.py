@@ -0,0 +1,249 @@
+"""
+Pathfinding Benchmark
+---------------------
+
+Measures Map.a_star() over a sweep of map sizes, terrain densities and heuristic
+weights, every map made from a fixed seed so runs can be compared.
+For each case it records the wall time, the search counters (SearchStats), the
+peak memory of the search and the cost of the path found. When a seed gives a map
+whose goal cannot be reached, the next seeds are tried, so every case times a real
+path search and not a flood fill of the start's pocket.
+
+Usage:
+    python benchmark.py run -o baseline.json
+    python benchmark.py run --sizes 100 500 --weights 1 2 -o quick.json
+    python benchmark.py compare baseline.json               (runs the same cases again)
+    python benchmark.py compare baseline.json new.json --threshold 0.1
+
+compare exits with status 1 when a case got slower (median time, by more than the
+time threshold), used more memory or expanded more cells by more than the threshold,
+or when a path cost changed.
+"""
+
+import argparse
+import contextlib
+import gc
+import heapq
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from mapword import Map, SearchStats, ComponentIndex
+
+# terrain densities: (normal, hill, water, obstacle) percentages for fill_random_grid()
+DENSITIES = {
+    "open":    (80, 10, 5, 5),
+    "default": (65, 15, 10, 10),
+    "rough":   (40, 25, 20, 15),
+    "blocked": (55, 10, 10, 25),
+}
+SIZES = (100, 250, 500, 1000, 2000, 4000)
+WEIGHTS = (0, 0.5, 1, 2, 5)  # the weight regimes main.py offers
+SEEDS = (1,)
+
+# measures compared by compare mode, a higher value is worse for all of them
+MEASURES = ("time", "peak_memory", "expanded", "pushes")
+# times shorter than this (in seconds) are mostly noise and are not compared
+MIN_TIME = 0.02
+# allowed growth of the median time; timings vary far more between runs than the
+# counters and memory, which are compared with the (lower) --threshold
+TIME_THRESHOLD = 0.25
+# seeds tried after the given one to find a map where the goal can be reached
+SEED_TRIES = 100
+# items pushed and popped by the reference workload
+REFERENCE_SIZE = 20000
+
+
+def reference_run() -> float:
+    """
+    Time one run of a fixed pure-Python workload (heap pushes and pops, like the
+    search loop). It is timed next to every search, and compare scales the times
+    by it, so a machine that got slower or faster as a whole (CPU frequency,
+    other load on the machine) does not show up as a regression.
+    """
+    began = time.perf_counter()
+    queue = []
+    for item in range(REFERENCE_SIZE):
+        heapq.heappush(queue, (item * 7919) % 20011)
+    while queue:
+        heapq.heappop(queue)
+    return time.perf_counter() - began
+
+
+def make_map(size: int, density: str, seed: int) -> tuple:
+    """
+    Return (map, seed used): the map of the given seed, or of the first seed after
+    it where the goal can be reached from the start.
+    """
+    for map_seed in range(seed, seed + SEED_TRIES):
+        world = Map(size, size)
+        world.fill_random_grid(*DENSITIES[density], seed=map_seed)
+        if ComponentIndex(world).connected(world.start, world.goal):
+            return world, map_seed
+    raise ValueError(f"no seed from {seed} to {seed + SEED_TRIES - 1} gives a reachable goal "
+                     f"on a {size}² {density} map")
+
+
+def run_case(size: int, density: str, weight: float, seed: int, repeat: int = 5) -> dict:
+    """
+    Benchmark one (size, density, weight, seed) case and return its results.
+    time is the median of repeat runs (best is the fastest one), memory and
+    counters are measured in a separate run each so they do not slow down the
+    timed ones. reference is the median time of reference_run(), run before each
+    timed search.
+    """
+    world, map_seed = make_map(size, density, seed)
+
+    # a_star() prints a message when there is no path, keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        world.a_star(weight)  # warm up: builds the step costs and the reusable arrays
+
+        # the collector would run at different points in different runs, keep it off
+        # while timing, like timeit does
+        times = []
+        references = []
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                references.append(reference_run())
+                began = time.perf_counter()
+                path = world.a_star(weight)
+                times.append(time.perf_counter() - began)
+        finally:
+            gc.enable()
+
+        stats = SearchStats()
+        world.a_star(weight, stats=stats)
+
+        # a fresh map on the same terrain, so the memory run sees everything a first search allocates
+        fresh = Map(size, size, terrain=world.terrain)
+        tracemalloc.start()
+        fresh.a_star(weight)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    result = {"size": size, "density": density, "weight": weight, "seed": seed,
+              "map_seed": map_seed, "time": statistics.median(times), "best": min(times),
+              "reference": statistics.median(references),
+              "peak_memory": peak_memory,
+              "length": len(path) if path else 0}
+    result.update(stats.as_dict())
+    if result["cost"] == float('inf'):
+        result["cost"] = None  # JSON has no infinity
+    return result
+
+
+def run_suite(sizes, densities, weights, seeds, repeat: int = 5) -> dict:
+    """
+    Run every combination of the given sizes, densities, weights and seeds.
+    """
+    results = []
+    for size in sizes:
+        for density in densities:
+            for seed in seeds:
+                for weight in weights:
+                    result = run_case(size, density, weight, seed, repeat)
+                    results.append(result)
+                    print(f"{size:>5}² {density:<8} w={weight:<4} seed={result['map_seed']}: "
+                          f"{result['time'] * 1000:9.1f} ms  {result['expanded']:>9} expanded  "
+                          f"{result['peak_memory'] / 1e6:8.1f} MB  cost {result['cost']}",
+                          file=sys.stderr)
+    return {"python": platform.python_version(), "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"), "repeat": repeat,
+            "results": results}
+
+
+def compare(baseline: dict, current: dict, threshold: float,
+            time_threshold: float = TIME_THRESHOLD) -> list:
+    """
+    Return a message for every regression of current against baseline:
+    the median time grew by more than time_threshold, another measure by more
+    than threshold (0.1 = 10 %), or a path cost changed.
+    Times under MIN_TIME are not compared. When both results have a reference
+    time, the current time is scaled by old reference / new reference first.
+    Cases that are only in one of the two are ignored.
+    """
+    def key(result):
+        return result["size"], result["density"], result["weight"], result["seed"]
+
+    old_results = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for new in current["results"]:
+        old = old_results.get(key(new))
+        if old is None:
+            continue
+        name = "{}² {} w={} seed={}".format(*key(new))
+        if new["cost"] != old["cost"]:
+            regressions.append(f"{name}: path cost changed from {old['cost']} to {new['cost']}")
+        for measure in MEASURES:
+            if measure == "time" and old["time"] < MIN_TIME:
+                continue
+            allowed = time_threshold if measure == "time" else threshold
+            value = new[measure]
+            if measure == "time" and old.get("reference") and new.get("reference"):
+                value *= old["reference"] / new["reference"]
+            if old[measure] and value > old[measure] * (1 + allowed):
+                change = (value / old[measure] - 1) * 100
+                regressions.append(f"{name}: {measure} {old[measure]:.4g} -> {value:.4g} (+{change:.0f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Map.a_star() and compare against a baseline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark and write the results as JSON")
+    run.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="map sizes (rows = cols)")
+    run.add_argument("--densities", nargs="+", choices=DENSITIES, default=list(DENSITIES))
+    run.add_argument("--weights", type=float, nargs="+", default=WEIGHTS)
+    run.add_argument("--seeds", type=int, nargs="+", default=SEEDS)
+    run.add_argument("--repeat", type=int, default=5, help="timed runs per case, the median counts")
+    run.add_argument("-o", "--output", default="-", help="JSON file to write (default: stdout)")
+
+    check = commands.add_parser("compare", help="compare results against a baseline")
+    check.add_argument("baseline", help="JSON written by the run command")
+    check.add_argument("current", nargs="?",
+                       help="JSON to compare (default: run the baseline's cases now)")
+    check.add_argument("--threshold", type=float, default=0.10,
+                       help="allowed growth of memory and counters, 0.10 = 10%% (default)")
+    check.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD,
+                       help=f"allowed growth of the median time (default {TIME_THRESHOLD})")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        weights = [int(weight) if float(weight).is_integer() else weight for weight in args.weights]
+        report = run_suite(args.sizes, args.densities, weights, args.seeds, args.repeat)
+        text = json.dumps(report, indent=2)
+        if args.output == "-":
+            print(text)
+        else:
+            with open(args.output, "w") as file:
+                file.write(text + "\n")
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if args.current:
+        with open(args.current) as file:
+            current = json.load(file)
+    else:
+        # same cases as the baseline, in the same order
+        current = {"results": [run_case(old["size"], old["density"], old["weight"], old["seed"],
+                                        baseline.get("repeat", 5))
+                               for old in baseline["results"]]}
+
+    regressions = compare(baseline, current, args.threshold, args.time_threshold)
+    for message in regressions:
+        print(message)
+    print(f"{len(regressions)} regression(s) in {len(current['results'])} case(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
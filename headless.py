@@ -0,0 +1,166 @@
+"""
+Headless Batch Runner
+---------------------
+
+Non-interactive mode of main.py: maps are generated or loaded, many queries are
+run without prompts or animation, and every result is written to stdout as one
+JSON line, so the output can be piped into other tools.
+
+Usage (through main.py, any argument switches it to headless mode):
+    python main.py --size 200 --seed 1 --queries 100 --weight 1 2
+    python main.py --load world.map --pairs 0,0:99,99 5,5:50,60
+    python main.py --scenario scenarios.json
+
+A scenario file is a JSON object, or a list of them, with the same settings as
+the command line options:
+    {"rows": 200, "cols": 200, "probabilities": [65, 15, 10, 10], "seed": 1,
+     "weights": [1, 2], "queries": 100, "pairs": [[[0, 0], [199, 199]]]}
+or {"load": "world.map", ...} to use a saved map instead of a random one.
+
+Each output line has the scenario number, start, goal, weight, path (null if
+there is none), cost, expanded cells and the search time in seconds.
+Counting the expanded cells runs the instrumented copy of the search, which is
+slower and skips the path cache. With --no-stats (or "stats": false in a
+scenario) the plain search is timed instead and expanded is null.
+A summary goes to stderr at the end.
+"""
+
+import argparse
+import contextlib
+import json
+import random
+import sys
+import time
+
+from mapword import Map, SearchStats, OPEN_LISTS
+
+
+def parse_pair(text: str) -> list:
+    # "x,y:x,y" -> [[x, y], [x, y]]
+    try:
+        start, goal = text.split(":")
+        return [[int(value) for value in start.split(",")], [int(value) for value in goal.split(",")]]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected start:goal as x,y:x,y, got {text!r}")
+
+
+def build_map(scenario: dict) -> Map:
+    """
+    Load the scenario's map file, or generate a random map from its size,
+    probabilities and seed.
+    """
+    if scenario.get("load"):
+        return Map.load(scenario["load"])
+
+    rows = scenario.get("rows", scenario.get("size", 10))
+    cols = scenario.get("cols", scenario.get("size", rows))
+    world = Map(rows, cols)
+    world.fill_random_grid(*scenario.get("probabilities", (65, 15, 10, 10)), seed=scenario.get("seed"))
+    return world
+
+
+def queries(world: Map, scenario: dict):
+    """
+    Yield the (start, goal) pairs of a scenario: the given pairs, then the random ones.
+    Without either, the map's own start and goal.
+    """
+    pairs = scenario.get("pairs") or []
+    count = scenario.get("queries", 0)
+    if not pairs and not count:
+        pairs = [[world.start, world.goal]]
+
+    for start, goal in pairs:
+        yield tuple(start), tuple(goal)
+
+    # random queries come from their own generator, so they do not depend on the map
+    rng = random.Random(scenario.get("seed"))
+    for _ in range(count):
+        yield ((rng.randrange(world.rows), rng.randrange(world.cols)),
+               (rng.randrange(world.rows), rng.randrange(world.cols)))
+
+
+def run_scenario(number: int, scenario: dict, out) -> tuple:
+    """
+    Run every query of one scenario with every weight, writing one JSON line each.
+    Returns (number of queries run, seconds spent searching).
+    """
+    world = build_map(scenario)
+    weights = scenario.get("weights", [scenario.get("weight", 1.0)])
+    engine = scenario.get("engine", "flat")
+    open_list = scenario.get("open_list", "auto")
+    with_path = scenario.get("path", True)
+    with_stats = scenario.get("stats", True)
+
+    count = 0
+    busy = 0.0
+    for start, goal in queries(world, scenario):
+        if not world.in_bounds(*start) or not world.in_bounds(*goal):
+            raise IndexError(f"query {start} -> {goal} is outside the {world.rows}x{world.cols} grid")
+        world.start, world.goal = start, goal
+        for weight in weights:
+            stats = SearchStats() if with_stats and engine == "flat" else None
+            began = time.perf_counter()
+            # a_star() prints a message when there is no path, keep stdout for the results
+            with contextlib.redirect_stdout(sys.stderr):
+                path = world.a_star(weight, engine=engine, open_list=open_list, stats=stats, compact=True)
+            elapsed = time.perf_counter() - began
+            busy += elapsed
+            count += 1
+
+            result = {"scenario": number, "start": start, "goal": goal, "weight": weight,
+                      "cost": None if path is None else path.cost,
+                      "length": 0 if path is None else len(path),
+                      "expanded": None if stats is None else stats.expanded,
+                      "time": elapsed}
+            if with_path:
+                result["path"] = None if path is None else path.to_list()
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    return count, busy
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="main.py", description="Run pathfinding queries without prompts, one JSON line per result.")
+    parser.add_argument("--scenario", help="JSON scenario file, replaces the map and query options")
+    parser.add_argument("--load", help="map file written by Map.save()")
+    parser.add_argument("--size", type=int, default=10, help="rows and columns of a random map")
+    parser.add_argument("--rows", type=int, help="rows of a random map (default: --size)")
+    parser.add_argument("--cols", type=int, help="columns of a random map (default: --size)")
+    parser.add_argument("--probabilities", type=int, nargs=4, default=[65, 15, 10, 10],
+                        metavar=("N", "H", "W", "O"), help="terrain probabilities of a random map")
+    parser.add_argument("--seed", type=int, help="seed of the random map and random queries")
+    parser.add_argument("--weight", type=float, nargs="+", default=[1.0], help="heuristic weights to run")
+    parser.add_argument("--queries", type=int, default=0, help="number of random start/goal queries")
+    parser.add_argument("--pairs", type=parse_pair, nargs="+", default=[], metavar="X,Y:X,Y",
+                        help="start/goal queries")
+    parser.add_argument("--engine", default="flat", choices=("flat", "grid", "bidirectional"))
+    parser.add_argument("--open-list", default="auto", choices=OPEN_LISTS)
+    parser.add_argument("--no-path", action="store_true", help="leave the path out of the results")
+    parser.add_argument("--no-stats", action="store_true",
+                        help="time the plain search, without counting expanded cells")
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        with open(args.scenario) as file:
+            scenarios = json.load(file)
+        if isinstance(scenarios, dict):
+            scenarios = [scenarios]
+    else:
+        scenarios = [{"load": args.load, "rows": args.rows or args.size, "cols": args.cols or args.size,
+                      "probabilities": args.probabilities, "seed": args.seed, "weights": args.weight,
+                      "queries": args.queries, "pairs": args.pairs, "engine": args.engine,
+                      "open_list": args.open_list, "path": not args.no_path, "stats": not args.no_stats}]
+
+    began = time.perf_counter()
+    total = 0
+    busy = 0.0
+    for number, scenario in enumerate(scenarios):
+        count, spent = run_scenario(number, scenario, sys.stdout)
+        total += count
+        busy += spent
+    elapsed = time.perf_counter() - began
+
+    rate = total / busy if busy else 0.0
+    print(f"{total} queries in {elapsed:.2f} s ({busy:.2f} s searching, {rate:.0f} queries/s)", file=sys.stderr)
+    return 0
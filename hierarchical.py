@@ -0,0 +1,447 @@
+"""
+Hierarchical Pathfinding (HPA*)
+-------------------------------
+
+This module defines a hierarchical planner for large maps. The Map is split
+into square clusters; cells where two neighbouring clusters can be crossed
+become entrance nodes of a small abstract graph, linked by the cheapest path
+inside each cluster. A query first searches the abstract graph and then only
+refines the route cluster by cluster, so far fewer cells are expanded than
+with A* over the whole map.
+"""
+
+import heapq
+
+from mapword import Map
+
+INF = float('inf')
+
+# runs of crossable border cells at least this long get an entrance at both ends
+LONG_ENTRANCE = 6
+
+
+class HierarchicalPlanner:
+    """
+    HPA* planner for one Map.
+     -cluster_size: side of the square clusters (cells at the bottom/right edge of the
+                    map may be in smaller clusters)
+    The abstraction follows the map: after Map.set_terrain() only the clusters the
+    changed cell belongs to (and the neighbour across the border, for a border cell)
+    are rebuilt, on the next query.
+    Paths are not always the cheapest. find_path() reports a suboptimality bound
+    for every path in last_bound.
+    """
+
+    def __init__(self, world: Map, cluster_size: int = 16) -> None:
+        if cluster_size < 2:
+            raise ValueError("cluster_size must be at least 2")
+        self.world = world
+        self.cluster_size = cluster_size
+
+        # cost / lower bound of the last path found (1.0 = surely the cheapest)
+        self.last_bound = None
+        self.last_cost = None
+
+        self._reset()
+        world.add_listener(self._terrain_changed)
+
+    def close(self) -> None:
+        """
+        Stop following terrain changes of the map.
+        """
+        self.world.remove_listener(self._terrain_changed)
+
+    #--> Queries
+    def find_path(self, start: tuple = None, goal: tuple = None) -> list:
+        """
+        Find a path from start to goal (default: the map's start and goal).
+        Returns the path as a list of (x, y) like Map.a_star(), or None if the goal
+        cannot be reached. last_cost and last_bound describe the path found:
+        last_bound = cost / a lower bound on the cheapest cost, so the path is at
+        most last_bound times more expensive than the best one.
+        """
+        world = self.world
+        start = tuple(world.start if start is None else start)
+        goal = tuple(world.goal if goal is None else goal)
+        for cell in (start, goal):
+            if not world.in_bounds(*cell):
+                raise IndexError(f"cell {cell} is outside the {world.rows}x{world.cols} grid")
+
+        self.last_bound = None
+        self.last_cost = None
+        self._refresh()
+
+        cols = world.cols
+        source = start[0] * cols + start[1]
+        target = goal[0] * cols + goal[1]
+        if source == target:
+            self.last_cost = 0
+            self.last_bound = 1.0
+            return [start]
+
+        route = self._abstract_search(source, target)
+        if route is None:
+            return None
+
+        # refine the route: cross edges are single steps, the rest are paths inside a cluster
+        path = [source]
+        cost = 0
+        for (node, cluster), (next_node, _) in zip(route, route[1:]):
+            if cluster is None:
+                path.append(next_node)
+            else:
+                path.extend(self._cluster_path(cluster, node, next_node))
+        for cell in path[1:]:
+            cost += world.costs[world.terrain[cell]]
+
+        # every step costs at least the cheapest terrain, so this is a lower bound
+        cheapest = min(c for c in world.costs if c > 0)
+        lower_bound = cheapest * (abs(start[0] - goal[0]) + abs(start[1] - goal[1]))
+        self.last_cost = cost
+        self.last_bound = cost / lower_bound
+
+        return [divmod(cell, cols) for cell in path]
+
+    #--> Abstract graph
+    def _reset(self) -> None:
+        world = self.world
+        size = self.cluster_size
+        self._cluster_rows = (world.rows + size - 1) // size
+        self._cluster_cols = (world.cols + size - 1) // size
+
+        self._borders = {}   # border key -> list of (cell, cell across) entrance pairs
+        self._cross = {}     # node -> list of (node across the border, cost of entering it)
+        self._intra = {}     # cluster -> {node: [(other node, cost)]}
+        self._local = {}     # cluster -> its local grid for searches inside it
+        self._dirty = set()  # clusters whose edges must be rebuilt before the next query
+
+        for ci in range(self._cluster_rows):
+            for cj in range(self._cluster_cols):
+                if ci + 1 < self._cluster_rows:
+                    self._scan_border(('h', ci, cj))
+                if cj + 1 < self._cluster_cols:
+                    self._scan_border(('v', ci, cj))
+
+        # cheapest paths between the entrances inside every cluster
+        for ci in range(self._cluster_rows):
+            for cj in range(self._cluster_cols):
+                self._intra_edges((ci, cj))
+
+    def _bounds(self, cluster: tuple) -> tuple:
+        # (first row, end row, first column, end column) of a cluster
+        size = self.cluster_size
+        ci, cj = cluster
+        return (ci * size, min((ci + 1) * size, self.world.rows),
+                cj * size, min((cj + 1) * size, self.world.cols))
+
+    def _cluster_of(self, cell: int) -> tuple:
+        x, y = divmod(cell, self.world.cols)
+        return (x // self.cluster_size, y // self.cluster_size)
+
+    def _cluster_borders(self, cluster: tuple) -> list:
+        # keys of the (up to 4) borders around a cluster
+        ci, cj = cluster
+        keys = []
+        if ci > 0:
+            keys.append(('h', ci - 1, cj))
+        if ci + 1 < self._cluster_rows:
+            keys.append(('h', ci, cj))
+        if cj > 0:
+            keys.append(('v', ci, cj - 1))
+        if cj + 1 < self._cluster_cols:
+            keys.append(('v', ci, cj))
+        return keys
+
+    def _scan_border(self, key: tuple) -> None:
+        """
+        Find the entrances on one border: runs of cells that are free on both sides.
+        Short runs get one entrance in the middle, long runs one at each end.
+        """
+        world = self.world
+        cols = world.cols
+        terrain = world.terrain
+        costs = world.costs
+        kind, ci, cj = key
+        row0, row1, col0, col1 = self._bounds((ci, cj))
+
+        # remove the cross edges of the old entrances
+        for a, b in self._borders.get(key, ()):
+            self._cross[a] = [edge for edge in self._cross.get(a, ()) if edge[0] != b]
+            self._cross[b] = [edge for edge in self._cross.get(b, ()) if edge[0] != a]
+
+        # pairs of cells facing each other across the border
+        if kind == 'h':
+            pairs = [((row1 - 1) * cols + y, row1 * cols + y) for y in range(col0, col1)]
+        else:
+            pairs = [(x * cols + col1 - 1, x * cols + col1) for x in range(row0, row1)]
+
+        entrances = []
+        run = []
+        for a, b in pairs + [(None, None)]:
+            if a is not None and costs[terrain[a]] < INF and costs[terrain[b]] < INF:
+                run.append((a, b))
+                continue
+            if run:
+                if len(run) < LONG_ENTRANCE:
+                    entrances.append(run[len(run) // 2])
+                else:
+                    entrances.append(run[0])
+                    entrances.append(run[-1])
+                run = []
+
+        self._borders[key] = entrances
+        for a, b in entrances:
+            self._cross.setdefault(a, []).append((b, costs[terrain[b]]))
+            self._cross.setdefault(b, []).append((a, costs[terrain[a]]))
+
+    def _nodes(self, cluster: tuple) -> set:
+        # entrance cells inside a cluster
+        nodes = set()
+        for key in self._cluster_borders(cluster):
+            for a, b in self._borders[key]:
+                nodes.add(a if self._cluster_of(a) == cluster else b)
+        return nodes
+
+    def _intra_edges(self, cluster: tuple) -> dict:
+        """
+        Cheapest cost between every ordered pair of entrances of a cluster,
+        moving only inside the cluster.
+        """
+        edges = self._intra.get(cluster)
+        if edges is None:
+            costs = self.world.costs
+            terrain = self.world.terrain
+            nodes = sorted(self._nodes(cluster))
+            edges = {node: [] for node in nodes}
+            for i, node in enumerate(nodes):
+                # only search towards the later nodes: walking a path backwards pays the
+                # first cell instead of the last one, so the way back costs
+                # cost - cost(other) + cost(node) and needs no search of its own
+                dist = self._search_cluster(cluster, node, nodes[i + 1:])
+                for other, cost in dist.items():
+                    edges[node].append((other, cost))
+                    edges[other].append((node, cost - costs[terrain[other]] + costs[terrain[node]]))
+            self._intra[cluster] = edges
+        return edges
+
+    def _refresh(self) -> None:
+        # rebuild the clusters that terrain changes made out of date
+        for cluster in self._dirty:
+            self._local.pop(cluster, None)
+            self._intra.pop(cluster, None)
+            self._intra_edges(cluster)
+        self._dirty.clear()
+
+    def _terrain_changed(self, cell, old_code) -> None:
+        if cell is None:
+            self._reset()  # the whole terrain was regenerated
+            return
+
+        x, y = cell
+        size = self.cluster_size
+        cluster = (x // size, y // size)
+        self._dirty.add(cluster)
+
+        # a cell on the edge of its cluster can change the entrances of that border,
+        # which changes the entrance nodes of the cluster on the other side too
+        row0, row1, col0, col1 = self._bounds(cluster)
+        ci, cj = cluster
+        sides = []
+        if x == row0 and ci > 0:
+            sides.append((('h', ci - 1, cj), (ci - 1, cj)))
+        if x == row1 - 1 and ci + 1 < self._cluster_rows:
+            sides.append((('h', ci, cj), (ci + 1, cj)))
+        if y == col0 and cj > 0:
+            sides.append((('v', ci, cj - 1), (ci, cj - 1)))
+        if y == col1 - 1 and cj + 1 < self._cluster_cols:
+            sides.append((('v', ci, cj), (ci, cj + 1)))
+        for key, other in sides:
+            self._scan_border(key)
+            self._dirty.add(other)
+
+    #--> Searches
+    def _local_grid(self, cluster: tuple) -> tuple:
+        """
+        Entering costs of one cluster as a small padded grid (0 = blocked), like
+        Map._step_costs() but only for the cluster, so a search inside it can never
+        step out. Returns (step, width).
+        """
+        grid = self._local.get(cluster)
+        if grid is None:
+            step = self.world._step_costs()
+            world_width = self.world.cols + 2
+            row0, row1, col0, col1 = self._bounds(cluster)
+            width = col1 - col0 + 2
+
+            local = [0] * width
+            for x in range(row0, row1):
+                first = (x + 1) * world_width + col0 + 1
+                local.append(0)
+                local.extend(step[first:first + col1 - col0])
+                local.append(0)
+            local.extend([0] * width)
+
+            grid = (local, width)
+            self._local[cluster] = grid
+        return grid
+
+    def _dijkstra_in_cluster(self, cluster: tuple, source: int, targets, reverse: bool = False):
+        """
+        Dijkstra from source that never leaves the cluster, on the cluster's local grid.
+        With reverse=True the costs are those of moving from each cell to source.
+        Stops early once every cell in targets is settled.
+        Returns (dist, parent, to_local, to_global): lists over local indices and
+        functions to convert flat map indices to local ones and back.
+        """
+        step, width = self._local_grid(cluster)
+        cols = self.world.cols
+        row0, _, col0, _ = self._bounds(cluster)
+
+        def to_local(cell):
+            x, y = divmod(cell, cols)
+            return (x - row0 + 1) * width + y - col0 + 1
+
+        def to_global(index):
+            x, y = divmod(index, width)
+            return (x - 1 + row0) * cols + y - 1 + col0
+
+        dist = [INF] * len(step)
+        parent = [-1] * len(step)
+        origin = to_local(source)
+        dist[origin] = 0
+        remaining = {to_local(cell) for cell in targets}
+        remaining.discard(origin)
+        priority_queue = [(0, origin)]
+        offsets = (-width, width, -1, 1)
+
+        while priority_queue and remaining:
+            current_cost, current = heapq.heappop(priority_queue)
+            if current_cost > dist[current]:
+                continue
+            if current in remaining:
+                remaining.discard(current)
+
+            enter_current = step[current]
+            if reverse and not enter_current:
+                continue  # nothing can move into an obstacle
+
+            for offset in offsets:
+                neighbour = current + offset
+                enter_neighbour = step[neighbour]
+                if not enter_neighbour:
+                    continue
+                new_cost = current_cost + (enter_current if reverse else enter_neighbour)
+                if new_cost < dist[neighbour]:
+                    dist[neighbour] = new_cost
+                    parent[neighbour] = current
+                    heapq.heappush(priority_queue, (new_cost, neighbour))
+
+        return dist, parent, to_local, to_global
+
+    def _search_cluster(self, cluster: tuple, source: int, targets, reverse: bool = False) -> dict:
+        """
+        Cheapest cost inside the cluster from source to each of targets (or from each
+        of targets to source with reverse=True). Returns {target: cost} for the
+        targets that can be reached.
+        """
+        dist, _, to_local, _ = self._dijkstra_in_cluster(cluster, source, targets, reverse)
+        found = {}
+        for cell in targets:
+            cost = dist[to_local(cell)]
+            if cost < INF:
+                found[cell] = cost
+        return found
+
+    def _cluster_path(self, cluster: tuple, source: int, target: int) -> list:
+        # cheapest path inside the cluster, as the flat indices after source up to target
+        _, parent, to_local, to_global = self._dijkstra_in_cluster(cluster, source, (target,))
+        piece = []
+        index = to_local(target)
+        origin = to_local(source)
+        while index != origin:
+            piece.append(to_global(index))
+            index = parent[index]
+        piece.reverse()
+        return piece
+
+    def _edges_to_nodes(self, cell: int) -> list:
+        # edges (node, cost, cluster) from a cell to every entrance of its cluster
+        cluster = self._cluster_of(cell)
+        nodes = self._nodes(cluster)
+        dist = self._search_cluster(cluster, cell, nodes)
+        return [(node, cost, cluster) for node, cost in dist.items()]
+
+    def _abstract_search(self, source: int, target: int) -> list:
+        """
+        A* over the entrance graph, with source and target linked to the entrances
+        of their clusters. Returns the route as [(node, cluster of the edge to the
+        next node or None for a single step), ..., (target, None)], or None.
+        """
+        cols = self.world.cols
+        target_cluster = self._cluster_of(target)
+
+        # source -> entrances of its cluster
+        starts = {source: self._edges_to_nodes(source)}
+        world = self.world
+        x, y = divmod(source, cols)
+        if world.check_obstacle(x, y):
+            # a robot on an obstacle is never an entrance and searches inside the cluster
+            # never enter it, but it can still step into any free neighbour: across a
+            # cluster border, or inside its cluster, where the neighbour links on to the
+            # entrances and, in the goal cluster, straight to the target
+            for next_x, next_y in world.find_moves(x, y):
+                neighbour = next_x * cols + next_y
+                starts[source].append((neighbour, world.move_cost(next_x, next_y), None))
+                starts[neighbour] = self._edges_to_nodes(neighbour)
+
+        # entrances of the goal cluster (and start cells in it) -> target
+        targets = self._nodes(target_cluster)
+        targets.update(cell for cell in starts if self._cluster_of(cell) == target_cluster)
+        goal_dist = self._search_cluster(target_cluster, target, targets, reverse=True)
+
+        goal_x, goal_y = divmod(target, cols)
+
+        def heuristic(node):
+            x, y = divmod(node, cols)
+            return abs(x - goal_x) + abs(y - goal_y)
+
+        g = {source: 0}
+        parent = {source: None}
+        priority_queue = [(heuristic(source), 0, source)]
+
+        while priority_queue:
+            _, current_g, current = heapq.heappop(priority_queue)
+            if current_g > g[current]:
+                continue  # outdated entry
+            if current == target:
+                break
+
+            # edges leaving this node: (next node, cost, cluster the move stays in or None)
+            cluster = self._cluster_of(current)
+            edges = []
+            if current in starts:
+                edges.extend(starts[current])
+            else:
+                edges.extend((node, cost, cluster)
+                             for node, cost in self._intra_edges(cluster).get(current, ()))
+            edges.extend((node, cost, None) for node, cost in self._cross.get(current, ()))
+            if cluster == target_cluster and current in goal_dist:
+                edges.append((target, goal_dist[current], cluster))
+
+            for node, cost, edge_cluster in edges:
+                new_g = current_g + cost
+                if node not in g or new_g < g[node]:
+                    g[node] = new_g
+                    parent[node] = (current, edge_cluster)
+                    heapq.heappush(priority_queue, (new_g + heuristic(node), new_g, node))
+
+        if target not in parent:
+            return None
+
+        route = [(target, None)]
+        node = target
+        while parent[node] is not None:
+            node, edge_cluster = parent[node]
+            route.append((node, edge_cluster))
+        route.reverse()
+        return route
@@ -0,0 +1,286 @@
+"""
+Incremental Replanning (D* Lite)
+--------------------------------
+
+This module defines an incremental planner for a Map. It keeps its search
+between calls, so when the terrain changes (for example a new obstacle is
+found by the robot) only the part of the search that the change affects is
+redone, instead of running A* again from scratch.
+"""
+
+import heapq
+
+from mapword import Map
+
+INF = float('inf')
+
+
+class IncrementalPlanner:
+    """
+    D* Lite planner for one Map.
+    The search runs backwards from the goal, so g(s) is the cost of the cheapest
+    path from cell s to the goal, with the same costs as Map.move_cost()
+    (the cost is paid when entering a cell).
+
+    Terrain changes are picked up through Map.add_listener(), so cells can be
+    changed with block()/set_terrain() here or with Map.set_terrain() directly.
+    Call replan() to get the updated path.
+    """
+
+    def __init__(self, world: Map) -> None:
+        self.world = world
+        self.start = world.start
+        self.goal = world.goal
+
+        # number of cells expanded by the last replan(), shows how much work a change cost
+        self.expanded = 0
+
+        self._reset()
+        world.add_listener(self._terrain_changed)
+
+    def close(self) -> None:
+        """
+        Stop following terrain changes of the map.
+        """
+        self.world.remove_listener(self._terrain_changed)
+
+    #--> Changing the world
+    def block(self, x: int, y: int) -> None:
+        """
+        Place an obstacle at (x, y).
+        """
+        self.world.set_terrain(x, y, 'O')
+
+    def set_terrain(self, x: int, y: int, terrain) -> None:
+        """
+        Change the terrain at (x, y), same arguments as Map.set_terrain().
+        """
+        self.world.set_terrain(x, y, terrain)
+
+    def move_to(self, x: int, y: int) -> None:
+        """
+        Move the robot (the start of the path) to (x, y), keeping the search.
+        """
+        new_start = self._index(x, y)
+        old_start = self._start
+        # the heuristic is measured from the start, so every key in the queue is now
+        # too high by at most h(old start, new start). D* Lite adds that to km instead
+        # of recomputing the whole queue.
+        self._km += self._h(self._last_start, new_start)
+        self._last_start = new_start
+        self._start = new_start
+        self.start = (x, y)
+
+        # the robot may stand on an obstacle (it appeared under it), it can still leave it.
+        # Obstacles are otherwise kept out of the search, except the goal, whose cost
+        # to itself stays 0 even while it is blocked.
+        if not self._step[old_start] and old_start != new_start and old_start != self._goal:
+            self._g[old_start] = INF
+            self._rhs[old_start] = INF
+            self._queued[old_start] = None
+        if not self._step[new_start] and new_start != self._goal:
+            self._rhs[new_start] = self._lookahead(new_start)
+            self._update_vertex(new_start)
+
+    #--> Planning
+    def replan(self) -> list:
+        """
+        Bring the search up to date and return the path from start to goal
+        as a list of (x, y), or None if the goal cannot be reached.
+        """
+        self._compute_shortest_path()
+
+        g = self._g
+        step = self._step
+        start = self._start
+        # the search may stop with the start overconsistent (rhs < g), rhs is its true cost then
+        if self._rhs[start] == INF:
+            return None
+
+        # follow the cheapest neighbour (entering cost + cost to goal) until the goal
+        path = [self.start]
+        current = start
+        width = self._width
+        while current != self._goal:
+            best = None
+            best_cost = INF
+            for neighbour in (current - width, current + width, current - 1, current + 1):
+                cost = step[neighbour]
+                if cost and cost + g[neighbour] < best_cost:
+                    best = neighbour
+                    best_cost = cost + g[neighbour]
+            if best is None or len(path) > len(step):
+                return None
+            current = best
+            row, col = divmod(current, width)
+            path.append((row - 1, col - 1))
+
+        return path
+
+    @property
+    def cost(self) -> float:
+        """
+        Cost of the path found by the last replan() (inf if there is none).
+        """
+        return self._rhs[self._start]
+
+    #--> D* Lite internals
+    def _reset(self) -> None:
+        # start a fresh search: only the goal is known, with cost 0 to itself
+        self._step = self.world._step_costs()
+        self._width = self.world.cols + 2
+        size = len(self._step)
+
+        self._g = [INF] * size
+        self._rhs = [INF] * size       # one-step lookahead of g
+        self._queued = [None] * size   # current key of each cell in the queue, None if not queued
+        self._queue = []               # heap of (key, cell), entries whose key is not _queued[cell] are stale
+        self._km = 0                   # key modifier for robot moves
+
+        self._start = self._index(*self.start)
+        self._goal = self._index(*self.goal)
+        self._last_start = self._start
+
+        self._rhs[self._goal] = 0
+        self._update_vertex(self._goal)
+
+    def _index(self, x: int, y: int) -> int:
+        # padded flat index of (x, y), same layout as Map._step_costs()
+        if not self.world.in_bounds(x, y):
+            raise IndexError(f"cell {(x, y)} is outside the {self.world.rows}x{self.world.cols} grid")
+        return (x + 1) * self._width + y + 1
+
+    def _h(self, a: int, b: int) -> int:
+        # Manhattan distance between two padded indices
+        row_a, col_a = divmod(a, self._width)
+        row_b, col_b = divmod(b, self._width)
+        return abs(row_a - row_b) + abs(col_a - col_b)
+
+    def _key(self, cell: int) -> tuple:
+        best = min(self._g[cell], self._rhs[cell])
+        return (best + self._h(self._start, cell) + self._km, best)
+
+    def _update_vertex(self, cell: int) -> None:
+        # a cell is in the queue exactly when it is inconsistent (g != rhs)
+        if self._g[cell] != self._rhs[cell]:
+            key = self._key(cell)
+            self._queued[cell] = key
+            heapq.heappush(self._queue, (key, cell))
+        else:
+            self._queued[cell] = None
+
+    def _lookahead(self, cell: int) -> float:
+        # rhs = cheapest (cost of entering a neighbour + its cost to the goal)
+        step = self._step
+        g = self._g
+        width = self._width
+        best = INF
+        for neighbour in (cell - width, cell + width, cell - 1, cell + 1):
+            cost = step[neighbour]
+            if cost and cost + g[neighbour] < best:
+                best = cost + g[neighbour]
+        return best
+
+    def _compute_shortest_path(self) -> None:
+        step = self._step
+        g = self._g
+        rhs = self._rhs
+        queued = self._queued
+        queue = self._queue
+        width = self._width
+        start = self._start
+        goal = self._goal
+        expanded = 0
+
+        while queue:
+            key, cell = queue[0]
+            if queued[cell] is not key:
+                heapq.heappop(queue)  # stale entry
+                continue
+
+            # stop once the start is consistent and nothing in the queue can improve it
+            if not (key < self._key(start) or rhs[start] > g[start]):
+                break
+
+            heapq.heappop(queue)
+            new_key = self._key(cell)
+            if key < new_key:
+                # the key was made before the robot moved, queue it again with the right key
+                queued[cell] = new_key
+                heapq.heappush(queue, (new_key, cell))
+                continue
+
+            expanded += 1
+            queued[cell] = None
+            enter_cost = step[cell]
+
+            if g[cell] > rhs[cell]:
+                # overconsistent: the cell got cheaper, pass it on to its neighbours
+                g[cell] = rhs[cell]
+                if not enter_cost:
+                    continue  # a blocked goal or start, no neighbour can move into it
+                for neighbour in (cell - width, cell + width, cell - 1, cell + 1):
+                    if (not step[neighbour] and neighbour != start) or neighbour == goal:
+                        continue
+                    if enter_cost + g[cell] < rhs[neighbour]:
+                        rhs[neighbour] = enter_cost + g[cell]
+                        self._update_vertex(neighbour)
+            else:
+                # underconsistent: the cell got more expensive, neighbours that went
+                # through it have to look again
+                old_g = g[cell]
+                g[cell] = INF
+                for neighbour in (cell - width, cell + width, cell - 1, cell + 1):
+                    if not enter_cost:
+                        break  # nothing went through a blocked cell
+                    if (not step[neighbour] and neighbour != start) or neighbour == goal:
+                        continue
+                    if rhs[neighbour] == enter_cost + old_g:
+                        rhs[neighbour] = self._lookahead(neighbour)
+                    self._update_vertex(neighbour)
+                self._update_vertex(cell)
+
+        self.expanded = expanded
+
+    def _terrain_changed(self, cell, old_code) -> None:
+        if cell is None:
+            # the whole terrain was regenerated, nothing of the old search is valid
+            self._reset()
+            return
+
+        self._step = self.world._step_costs()
+        step = self._step
+        g = self._g
+        rhs = self._rhs
+        width = self._width
+
+        changed = self._index(*cell)
+        old_cost = self.world.costs[old_code]
+        new_cost = step[changed] or INF
+
+        # every neighbour pays the new cost to enter the changed cell
+        for neighbour in (changed - width, changed + width, changed - 1, changed + 1):
+            if (not step[neighbour] and neighbour != self._start) or neighbour == self._goal:
+                continue
+            if old_cost > new_cost:
+                rhs[neighbour] = min(rhs[neighbour], new_cost + g[changed])
+            elif rhs[neighbour] == old_cost + g[changed]:
+                rhs[neighbour] = self._lookahead(neighbour)
+            self._update_vertex(neighbour)
+
+        if changed == self._goal:
+            # the goal costs 0 to itself whatever its terrain, only entering it changed,
+            # which the neighbours above took care of. A goal that was blocked never
+            # passed its cost on, so being freed is handled there too.
+            return
+        if changed == self._start:
+            return  # the robot can always leave the cell it stands on
+        if new_cost == INF:
+            # nobody can stand on an obstacle, drop it from the search
+            g[changed] = INF
+            rhs[changed] = INF
+            self._queued[changed] = None
+        elif old_cost == INF:
+            # a free cell again, find its cost to the goal from its neighbours
+            rhs[changed] = self._lookahead(changed)
+            self._update_vertex(changed)
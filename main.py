@@ -6,10 +6,21 @@ This script handles:
 - Grid generation
 - Execution of the weighted A* algorithm
 - Displaying results and optional re-planning when obstacles are added
+Run with arguments (python main.py --help) for the headless batch mode instead.
 
 """
 
-from mapword import Map
+import sys
+
+# With command line arguments the program runs headless (see headless.py): no prompts,
+# colors or animation, only JSON lines. It is imported here, before anything the
+# interactive program needs.
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from headless import main as run_headless
+    sys.exit(run_headless(sys.argv[1:]))
+
+from mapword import Map, SearchStats
+from incremental import IncrementalPlanner
 
 # ANSI color codes for terminal text formatting
 YELLOW = "\033[93m"
@@ -110,7 +121,10 @@ if __name__ == "__main__":
 
     # RUN THE ALGORITHM
     print(f"\n{YELLOW}Running Weighted A* Algorithm...{RESET}\n")
-    path = land1.a_star(weight=weight)
+    # count the cells the search explores, to show what the weight changes
+    stats = SearchStats()
+    # compact: the cost comes from the search instead of adding up the cells again
+    path = land1.a_star(weight=weight, stats=stats, compact=True)
 
     # ANIMATE THE ROBOT MOVEMENT IF PATH FOUND
     if path:
@@ -124,13 +138,15 @@ if __name__ == "__main__":
         print(f"{GREEN}Goal:{RESET} {land1.goal}\n")
 
         print(f"{GREEN}Algorithm used: Weighted A*{RESET}")
-        print(f"{GREEN}Heuristic weight:{RESET} {weight}\n")
+        print(f"{GREEN}Heuristic weight:{RESET} {weight}")
+        print(f"{GREEN}Cells explored:{RESET} {stats.expanded} (search took {stats.search_time * 1000:.1f} ms)\n")
 
         print(f"{GREEN}Path found:{RESET}")
-        print(path)
+        print(path.to_list())
 
         print(f"\n{GREEN}Path length:{RESET} {len(path)}")
-        print(f"{GREEN}Total movement cost:{RESET} {sum(land1.move_cost(x, y) for x, y in path)}\n")
+        # the total shown here has always counted the start cell too
+        print(f"{GREEN}Total movement cost:{RESET} {land1.move_cost(*path.start) + path.cost}\n")
 
     else:
         print(f"\n{RED}No path could be found — goal is unreachable due to obstacles.{RESET}\n")
@@ -138,6 +154,13 @@ if __name__ == "__main__":
 
     #ADD NEW OBSTACLES & RE-RUN A*
     # Allow user to add new obstacles and re-run the algorithm
+    # The incremental planner keeps its search between obstacles, so each re-run only
+    # redoes the part affected by the new obstacle. It always finds the cheapest path,
+    # which is what w <= 1 gives too, so aggressive weights (w > 1) still re-run weighted A*.
+    planner = IncrementalPlanner(land1) if weight <= 1 else None
+    # connected components of the free cells, kept up to date as obstacles are added, so a
+    # goal that got cut off is found at once instead of after searching everything around the robot
+    land1.build_components()
     while True:
         add_obs = input(f"\n{GREEN}Would you like to simulate new unexpected obstacles? (y/n): {RESET}").strip().lower()
         if add_obs == 'y':
@@ -153,7 +176,7 @@ if __name__ == "__main__":
                     print(f"{RED}Error: cannot place an obstacle on Start or Goal!{RESET}")
                     continue
                 # Place the new obstacle
-                land1.grid[x][y] = f"{RED}O{RESET}"
+                land1.set_terrain(x, y, 'O')
                 print(f"{YELLOW}New obstacle added at ({x}, {y}).{RESET}")
                 print(f"{YELLOW}Updated Map:{RESET}\n")
                 land1.print_grid()
@@ -164,7 +187,15 @@ if __name__ == "__main__":
 
             # Re-run A* after new obstacle placement
             print(f"\n{YELLOW}Re-running A* algorithm to find new path...{RESET}\n")
-            new_path = land1.a_star(weight=weight)
+            # both searches know the cost of the path they found, nothing is added up again
+            if not land1.reachable():
+                new_path = None
+            elif planner is not None:
+                new_path = planner.replan()
+                new_cost = planner.cost
+            else:
+                new_path = land1.a_star(weight=weight, compact=True)
+                new_cost = None if new_path is None else new_path.cost
 
             if new_path:
                 input(f"\n{GREEN}Press Enter to see the robot navigate the new route...{RESET}\n")
@@ -173,8 +204,9 @@ if __name__ == "__main__":
                 # FINAL SUMMARY FOR NEW PATH
                 print(f"\n{GREEN}New path successfully found!{RESET}")
                 print(f"Path length: {len(new_path)}")
-                print(f"Total movement cost: {sum(land1.move_cost(x, y) for x, y in new_path)}\n")
-                print(new_path)
+                # counting the start cell, like the first summary
+                print(f"Total movement cost: {land1.move_cost(*land1.start) + new_cost}\n")
+                print(list(new_path))
             else:
                 print(f"{RED}No valid path found — the robot is trapped by new obstacles!{RESET}\n")
 
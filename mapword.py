@@ -11,7 +11,17 @@ ANSI color codes are used for better console visualization.
 import random
 import heapq  # we use heapq for the priority queue (min-heap)
 import os
+import re
+import sys
+import shutil
 import time
+import struct
+import tempfile
+import mmap as memory_map
+from array import array
+from collections import OrderedDict, namedtuple
+from multiprocessing import Pool
+from multiprocessing import shared_memory
 
 # ANSI color codes
 GREEN = "\033[92m"
@@ -20,6 +30,735 @@ YELLOW = "\033[93m"
 MAGENTA = "\033[95m"
 RESET = "\033[0m"
 
+# Terrain codes, one byte per cell in Map.terrain
+NORMAL = 0
+HILL = 1
+WATER = 2
+OBSTACLE = 3
+
+# symbol of each terrain code (index = code)
+TERRAIN_SYMBOLS = ('N', 'H', 'W', 'O')
+# and the way back, from symbol to code
+TERRAIN_CODES = {'N': NORMAL, 'H': HILL, 'W': WATER, 'O': OBSTACLE}
+# default cost of entering a cell of each terrain code (index = code)
+TERRAIN_COSTS = (1, 3, 5, float('inf'))
+# how each terrain code is shown on the console, colors are only added here
+TERRAIN_DISPLAY = ('N', 'H', 'W', f"{RED}O{RESET}")
+
+
+class _GridRow:
+    """
+    Read-only view of one row of the terrain, so grid[x][y] gives back 'N', 'H', 'W' or 'O'.
+    """
+
+    def __init__(self, terrain, offset: int, cols: int) -> None:
+        self._terrain = terrain
+        self._offset = offset
+        self._cols = cols
+
+    def __len__(self) -> int:
+        return self._cols
+
+    def __getitem__(self, y):
+        if isinstance(y, slice):
+            return [self[i] for i in range(*y.indices(self._cols))]
+        if y < 0:
+            y += self._cols
+        if y < 0 or y >= self._cols:
+            raise IndexError("grid column index out of range")
+        return TERRAIN_SYMBOLS[self._terrain[self._offset + y]]
+
+    def __iter__(self):
+        for code in self._terrain[self._offset:self._offset + self._cols]:
+            yield TERRAIN_SYMBOLS[code]
+
+
+class _GridView:
+    """
+    Read-only list-of-lists view over Map.terrain, kept for code that still reads map.grid[x][y].
+    Use Map.set_terrain() to change a cell.
+    """
+
+    def __init__(self, world) -> None:
+        self._world = world
+
+    def __len__(self) -> int:
+        return self._world.rows
+
+    def __getitem__(self, x):
+        rows = self._world.rows
+        if isinstance(x, slice):
+            return [self[i] for i in range(*x.indices(rows))]
+        if x < 0:
+            x += rows
+        if x < 0 or x >= rows:
+            raise IndexError("grid row index out of range")
+        return _GridRow(self._world.terrain, x * self._world.cols, self._world.cols)
+
+    def __iter__(self):
+        for x in range(self._world.rows):
+            yield self[x]
+
+# (row change, column change) of each direction, used to store moves in one byte
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))  # up, down, left, right
+
+
+class DistanceField:
+    """
+    Cost-to-go from every cell to one goal, made by one reverse Dijkstra search.
+    cost[i] is the cheapest cost from cell i (i = x * cols + y) to the goal, inf if it
+    cannot reach it. step[i] is the direction (index in DIRECTIONS) of the next cell
+    on that cheapest path, -1 for none. A path from any start is found by following
+    the directions, without searching again.
+    """
+
+    def __init__(self, goal: tuple, rows: int, cols: int, cost: array, step: array) -> None:
+        self.goal = goal
+        self.rows = rows
+        self.cols = cols
+        self.cost = cost
+        self.step = step
+
+    @property
+    def nbytes(self) -> int:
+        # memory used by the two arrays
+        return len(self.cost) * self.cost.itemsize + len(self.step) * self.step.itemsize
+
+    def path(self, start: tuple, world=None) -> list:
+        """
+        Return the cheapest path from start to the goal as a list of (x, y),
+        or None if the goal cannot be reached.
+        If the start is an obstacle (the robot can still leave it), the map is
+        needed to pick the best free neighbour.
+        """
+        cols = self.cols
+        x, y = start
+        path = [start]
+        if self.cost[x * cols + y] == float('inf'):
+            if world is None:
+                return None
+            # leave the blocked start through its cheapest neighbour
+            best = None
+            best_cost = float('inf')
+            for next_x, next_y in world.find_moves(x, y):
+                total = world.move_cost(next_x, next_y) + self.cost[next_x * cols + next_y]
+                if total < best_cost:
+                    best, best_cost = (next_x, next_y), total
+            if best is None:
+                return None
+            x, y = best
+            path.append(best)
+
+        goal_x, goal_y = self.goal
+        while x != goal_x or y != goal_y:
+            d_x, d_y = DIRECTIONS[self.step[x * cols + y]]
+            x += d_x
+            y += d_y
+            path.append((x, y))
+        return path
+
+
+class ComponentIndex:
+    """
+    Connected components of the free (non-obstacle) cells of a map, so a query
+    between two cells in different components is answered without any search.
+    Each cell gets a label and labels are merged with union-find, so
+    connected(a, b) is two find() calls.
+    The index follows terrain changes through Map.add_listener():
+      - freeing a cell gives it a new label merged with its free neighbours
+      - blocking a cell can split its component. When the free cells around it stay
+        connected to each other inside its 3x3 neighbourhood nothing is split, else
+        the index is marked dirty and relabelled the next time it is needed.
+        Blocking never joins components, so while dirty a "not connected" answer
+        is still right and only a "connected" answer needs the relabel.
+    """
+
+    def __init__(self, world) -> None:
+        self.world = world
+        self.rebuilds = 0   # number of full labellings, shows how often edits forced one
+        self.rebuild()
+        world.add_listener(self.terrain_changed)
+
+    def close(self) -> None:
+        """
+        Stop following terrain changes of the map.
+        """
+        self.world.remove_listener(self.terrain_changed)
+
+    def rebuild(self) -> None:
+        """
+        Label every free cell again.
+        Free cells are found as runs inside each row (one regular expression over
+        the row's bytes), every run gets one label, and runs that overlap a run of
+        the row above are merged, so the work is per run instead of per cell.
+        """
+        world = self.world
+        rows, cols = world.rows, world.cols
+        terrain = world.terrain
+        blocked = bytes(code for code in range(len(world.costs)) if world.blocked_code(code))
+        free_run = re.compile(b"[^" + re.escape(blocked) + b"]+" if blocked else b".+", re.DOTALL)
+
+        labels = array('i', [-1]) * (rows * cols)
+        parent = []
+        above = []  # (begin, end, label) of the runs of the row above
+        for x in range(rows):
+            row_start = x * cols
+            runs = []
+            previous = 0
+            for match in free_run.finditer(terrain, row_start, row_start + cols):
+                begin, end = match.span()
+                label = len(parent)
+                parent.append(label)
+                labels[begin:end] = array('i', [label]) * (end - begin)
+                begin -= row_start
+                end -= row_start
+                runs.append((begin, end, label))
+
+                # merge with every run above that shares a column with this one
+                while previous < len(above) and above[previous][1] <= begin:
+                    previous += 1
+                index = previous
+                while index < len(above) and above[index][0] < end:
+                    self._union(parent, above[index][2], label)
+                    index += 1
+            above = runs
+
+        self.labels = labels
+        self.parent = parent
+        self.dirty = False
+        self.rebuilds += 1
+
+    @staticmethod
+    def _find(parent: list, label: int) -> int:
+        root = label
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[label] != root:
+            parent[label], label = root, parent[label]
+        return root
+
+    def _union(self, parent: list, a: int, b: int) -> None:
+        a = self._find(parent, a)
+        b = self._find(parent, b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    def component(self, cell: tuple) -> int:
+        """
+        Label of the component of cell (x, y), -1 for an obstacle.
+        """
+        if self.dirty or self.labels is None:
+            self.rebuild()
+        label = self.labels[cell[0] * self.world.cols + cell[1]]
+        return -1 if label < 0 else self._find(self.parent, label)
+
+    def connected(self, start: tuple, goal: tuple) -> bool:
+        """
+        True if a path from start to goal can exist.
+        Like the searches, the start may be an obstacle (the robot can still leave it),
+        the goal has to be free.
+        """
+        if self.labels is None:
+            self.rebuild()
+        if not self._same_component(start, goal):
+            return False  # blocking cells never joins components, so this holds even when dirty
+        if self.dirty:
+            self.rebuild()  # a split may have separated them, label again and look once more
+            return self._same_component(start, goal)
+        return True
+
+    def _same_component(self, start: tuple, goal: tuple) -> bool:
+        world = self.world
+        cols = world.cols
+        labels = self.labels
+        if tuple(start) == tuple(goal):
+            return True
+        goal_label = labels[goal[0] * cols + goal[1]]
+        if goal_label < 0:
+            return False
+
+        # labels of the cells the robot can start from
+        x, y = start
+        starts = [labels[x * cols + y]]
+        if starts[0] < 0:
+            starts = [labels[n_x * cols + n_y] for n_x, n_y in world.find_moves(x, y)]
+        goal_root = self._find(self.parent, goal_label)
+        return any(label >= 0 and self._find(self.parent, label) == goal_root for label in starts)
+
+    def terrain_changed(self, cell, old_code) -> None:
+        """
+        Listener for Map.add_listener(), keeps the labels up to date after a change.
+        """
+        world = self.world
+        if cell is None:
+            self.labels = None  # the whole terrain was regenerated, label it when next needed
+            return
+        if self.labels is None:
+            return
+
+        was_blocked = world.blocked_code(old_code)
+        is_blocked = world.check_obstacle(*cell)
+        if was_blocked == is_blocked:
+            return  # only the cost changed
+
+        x, y = cell
+        cols = world.cols
+        index = x * cols + y
+        labels = self.labels
+        parent = self.parent
+
+        if not is_blocked:
+            # a freed cell joins the components of its free neighbours
+            label = len(parent)
+            parent.append(label)
+            labels[index] = label
+            for n_x, n_y in world.find_moves(x, y):
+                self._union(parent, label, labels[n_x * cols + n_y])
+            return
+
+        labels[index] = -1
+        if self.dirty:
+            return  # everything is labelled again before the next "connected" answer
+        # the 8 cells around (x, y) in order around it, every two next to each other share
+        # a side. The free ones form arcs; when all free side neighbours are on one arc
+        # they stay connected around the new obstacle and nothing can be split.
+        ring = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+        free = [world.in_bounds(x + d_x, y + d_y) and not world.check_obstacle(x + d_x, y + d_y)
+                for d_x, d_y in ring]
+        if all(free) or not any(free):
+            return
+        first = free.index(False)  # start counting at a blocked cell so no arc wraps around
+        arcs = 0
+        in_arc = False
+        touches_side = False
+        for offset in range(1, 9):
+            position = (first + offset) % 8
+            if free[position]:
+                in_arc = True
+                touches_side = touches_side or position % 2 == 1
+            elif in_arc:
+                arcs += touches_side
+                in_arc = touches_side = False
+        if arcs > 1:
+            self.dirty = True
+
+
+class _GoalIndex:
+    """
+    Goals sorted into square buckets, to find the Manhattan distance from a cell to
+    its closest goal without looking at every goal. Buckets are searched in rings
+    around the cell's bucket; a goal in ring k is at least (k - 1) * size + 1 away,
+    so the search stops as soon as no further ring can hold a closer goal.
+    """
+
+    def __init__(self, goals, size: int) -> None:
+        self.size = size
+        self.buckets = {}
+        for x, y in goals:
+            self.buckets.setdefault((x // size, y // size), []).append((x, y))
+        keys = self.buckets.keys()
+        self.low_x = min(key[0] for key in keys)
+        self.high_x = max(key[0] for key in keys)
+        self.low_y = min(key[1] for key in keys)
+        self.high_y = max(key[1] for key in keys)
+
+    def distance(self, x: int, y: int) -> int:
+        size = self.size
+        bucket_x, bucket_y = x // size, y // size
+        buckets = self.buckets
+        # rings past this one are outside every bucket that holds a goal
+        last_ring = max(abs(bucket_x - self.low_x), abs(bucket_x - self.high_x),
+                        abs(bucket_y - self.low_y), abs(bucket_y - self.high_y))
+        best = float('inf')
+        ring = 0
+        while ring <= last_ring and best > (ring - 1) * size:
+            for b_x in range(bucket_x - ring, bucket_x + ring + 1):
+                # whole top and bottom rows of the ring, only the two ends of the others
+                step = 1 if b_x in (bucket_x - ring, bucket_x + ring) else max(1, 2 * ring)
+                for b_y in range(bucket_y - ring, bucket_y + ring + 1, step):
+                    for goal_x, goal_y in buckets.get((b_x, b_y), ()):
+                        distance = abs(goal_x - x) + abs(goal_y - y)
+                        if distance < best:
+                            best = distance
+            ring += 1
+        return best
+
+
+class CostField:
+    """
+    Cost from one source cell to every cell of the map, made by Map.cost_field().
+    cost is a NumPy array of shape (rows, cols), cost[x, y] is the cheapest cost of
+    going from the source to (x, y) (inf if it cannot be reached), with the same
+    costs as Map.move_cost() (the cost is paid when entering a cell).
+    """
+
+    def __init__(self, source: tuple, cost, enter_cost) -> None:
+        self.source = source
+        self.cost = cost
+        self._enter_cost = enter_cost   # entering cost of every cell, inf for obstacles
+        self.rows, self.cols = cost.shape
+
+    def __getitem__(self, cell: tuple) -> float:
+        return float(self.cost[cell[0], cell[1]])
+
+    def path(self, target: tuple) -> list:
+        """
+        Return the cheapest path from the source to target as a list of (x, y), or None
+        if target cannot be reached. It walks down the field from the target: the cell
+        before any cell v on a cheapest path is a neighbour u with
+        cost(u) + entering cost(v) = cost(v), the one with the lowest cost.
+        """
+        cost = self.cost
+        x, y = target
+        if cost[x, y] == float('inf'):
+            return None
+
+        path = [(x, y)]
+        while (x, y) != self.source:
+            best = None
+            for d_x, d_y in DIRECTIONS:
+                n_x, n_y = x + d_x, y + d_y
+                if 0 <= n_x < self.rows and 0 <= n_y < self.cols and \
+                        cost[n_x, n_y] + self._enter_cost[x, y] == cost[x, y]:
+                    if best is None or cost[n_x, n_y] < cost[best]:
+                        best = (n_x, n_y)
+            x, y = best
+            path.append(best)
+
+        path.reverse()
+        return path
+
+
+class CompactPath:
+    """
+    A path kept as its start cell and its moves, made by a_star(compact=True).
+    The moves are run-length encoded, one byte per run of moves in the same direction:
+    the top 2 bits are the direction (index in DIRECTIONS), the low 6 bits are the
+    run length - 1, so a straight stretch of up to 64 cells takes one byte.
+    cost is the cost of the path (the cost of every cell entered after the start),
+    taken from the search, so nothing has to add it up again.
+    Iterating yields the cells one at a time, to_list() gives the list of (x, y)
+    that a_star() returns otherwise.
+    """
+
+    MAX_RUN = 64
+
+    def __init__(self, start: tuple, moves: bytes = b"", cost: float = 0) -> None:
+        self.start = tuple(start)
+        self.moves = bytes(moves)
+        self.cost = cost
+        self._length = 1 + sum((move & 0x3F) + 1 for move in self.moves)
+
+    @classmethod
+    def from_cells(cls, cells, cost: float = None, world=None) -> "CompactPath":
+        """
+        Encode a list of (x, y) cells, each next to the one before it.
+        Without cost it is added up with world.move_cost().
+        """
+        cells = list(cells)
+        if not cells:
+            raise ValueError("a path needs at least one cell")
+        if cost is None:
+            if world is None:
+                raise ValueError("give the cost of the path or the map to add it up")
+            cost = sum(world.move_cost(x, y) for x, y in cells[1:])
+
+        moves = bytearray()
+        run_direction, run = -1, 0
+        for (x, y), (n_x, n_y) in zip(cells, cells[1:]):
+            try:
+                direction = DIRECTIONS.index((n_x - x, n_y - y))
+            except ValueError:
+                raise ValueError(f"cells {(x, y)} and {(n_x, n_y)} are not neighbours") from None
+            if direction == run_direction and run < cls.MAX_RUN:
+                run += 1
+                continue
+            if run:
+                moves.append(run_direction << 6 | (run - 1))
+            run_direction, run = direction, 1
+        if run:
+            moves.append(run_direction << 6 | (run - 1))
+        return cls(cells[0], moves, cost)
+
+    @property
+    def end(self) -> tuple:
+        """
+        Last cell of the path, without walking the cells in between.
+        """
+        x, y = self.start
+        for move in self.moves:
+            d_x, d_y = DIRECTIONS[move >> 6]
+            run = (move & 0x3F) + 1
+            x, y = x + d_x * run, y + d_y * run
+        return (x, y)
+
+    def __iter__(self):
+        x, y = self.start
+        yield (x, y)
+        for move in self.moves:
+            d_x, d_y = DIRECTIONS[move >> 6]
+            for _ in range((move & 0x3F) + 1):
+                x, y = x + d_x, y + d_y
+                yield (x, y)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CompactPath):
+            return (self.start, self.moves, self.cost) == (other.start, other.moves, other.cost)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CompactPath(start={self.start}, end={self.end}, cells={len(self)}, cost={self.cost})"
+
+    def to_list(self) -> list:
+        """
+        The path as a list of (x, y), the same as a_star() without compact.
+        """
+        return list(self)
+
+    def to_bytes(self) -> bytes:
+        """
+        Header (start x, start y, cost) followed by the move bytes.
+        """
+        return COMPACT_PATH_HEADER.pack(self.start[0], self.start[1], self.cost) + self.moves
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CompactPath":
+        """
+        Read a path written by to_bytes().
+        """
+        if len(data) < COMPACT_PATH_HEADER.size:
+            raise ValueError(f"compact path needs at least {COMPACT_PATH_HEADER.size} bytes, got {len(data)}")
+        x, y, cost = COMPACT_PATH_HEADER.unpack_from(data)
+        return cls((x, y), data[COMPACT_PATH_HEADER.size:], cost)
+
+
+class BucketQueue:
+    """
+    Open list for small non-negative integer priorities (Dial's bucket queue).
+    Bucket p holds the items with priority p, so push and pop cost O(1) instead of
+    the O(log n) of a binary heap. Pushing an item again with a new priority replaces
+    the old one (its old entry is skipped when its bucket is reached).
+     -size: items are integers from 0 to size - 1
+    The queue can be emptied with clear() and used again, which only touches the
+    entries still in it, so a search does not pay for a table over all items.
+    skipped counts the old entries pop() has passed over since the last clear().
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._buckets = []              # bucket p = items pushed with priority p
+        self._priority = [-1] * size    # current priority of each item, -1 if not queued
+        self._lowest = 0                # no item has a lower priority than this
+        self._count = 0
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        priority = self._priority
+        for bucket in self._buckets:
+            for item in bucket:
+                priority[item] = -1
+        self._buckets.clear()
+        self._lowest = 0
+        self._count = 0
+        self.skipped = 0
+
+    def push(self, item: int, priority: int) -> None:
+        if self._priority[item] < 0:
+            self._count += 1
+        self._priority[item] = priority
+
+        buckets = self._buckets
+        if priority >= len(buckets):
+            buckets.extend([] for _ in range(priority + 1 - len(buckets)))
+        buckets[priority].append(item)
+
+        # priorities can go down with an inflated heuristic (w > 1)
+        if priority < self._lowest:
+            self._lowest = priority
+
+    def pop(self) -> tuple:
+        """
+        Remove and return (priority, item) with the lowest priority.
+        """
+        buckets = self._buckets
+        current = self._priority
+        lowest = self._lowest
+        while True:
+            bucket = buckets[lowest]
+            while bucket:
+                item = bucket.pop()
+                if current[item] == lowest:  # else it was pushed again since
+                    current[item] = -1
+                    self._count -= 1
+                    self._lowest = lowest
+                    return lowest, item
+                self.skipped += 1
+            lowest += 1
+
+
+class IndexedHeap:
+    """
+    Binary min-heap open list with decrease-key.
+    The position of every item in the heap is kept, so pushing an item that is
+    already queued moves it up instead of adding a second entry: the heap never
+    holds more than one entry per item.
+     -size: items are integers from 0 to size - 1
+    Like BucketQueue it can be emptied with clear() and used again.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._keys = []              # priorities, in heap order
+        self._items = []             # items, in the same order
+        self._position = [-1] * size # index of each item in the heap, -1 if not queued
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        position = self._position
+        for item in self._items:
+            position[item] = -1
+        self._keys.clear()
+        self._items.clear()
+
+    def push(self, item: int, priority) -> None:
+        keys = self._keys
+        items = self._items
+        position = self._position
+
+        index = position[item]
+        if index < 0:
+            index = len(keys)
+            keys.append(priority)
+            items.append(item)
+        elif priority >= keys[index]:
+            return  # never raise a priority
+
+        # sift up: move bigger parents down until the item fits
+        while index:
+            parent = (index - 1) >> 1
+            parent_key = keys[parent]
+            if priority >= parent_key:
+                break
+            keys[index] = parent_key
+            moved = items[parent]
+            items[index] = moved
+            position[moved] = index
+            index = parent
+        keys[index] = priority
+        items[index] = item
+        position[item] = index
+
+    def pop(self) -> tuple:
+        """
+        Remove and return (priority, item) with the lowest priority.
+        """
+        keys = self._keys
+        items = self._items
+        position = self._position
+
+        top_key, top = keys[0], items[0]
+        position[top] = -1
+        last_key, last = keys.pop(), items.pop()
+
+        # sift down: move the last entry from the root to where it fits
+        size = len(keys)
+        if size:
+            index = 0
+            while True:
+                child = 2 * index + 1
+                if child >= size:
+                    break
+                child_key = keys[child]
+                if child + 1 < size and keys[child + 1] < child_key:
+                    child += 1
+                    child_key = keys[child]
+                if child_key >= last_key:
+                    break
+                keys[index] = child_key
+                moved = items[child]
+                items[index] = moved
+                position[moved] = index
+                index = child
+            keys[index] = last_key
+            items[index] = last
+            position[last] = index
+
+        return top_key, top
+
+
+class SearchStats:
+    """
+    Counters of one A* search, filled in when passed to Map.a_star(stats=...).
+     -expanded: cells taken from the open list and expanded
+     -pushes: entries added to the open list
+     -stale: outdated entries popped and skipped (a cheaper g was found after the push).
+             Always 0 with the indexed open list, which moves an entry instead of
+             adding a second one.
+     -peak_open: largest size of the open list
+     -max_g: largest g-score of an expanded cell
+     -cost: cost of the path found (inf if none)
+     -setup_time: seconds spent getting the step costs and search arrays ready
+     -search_time: seconds spent in the search loop
+     -path_time: seconds spent rebuilding the path from the parents
+    """
+
+    def __init__(self) -> None:
+        self.expanded = 0
+        self.pushes = 0
+        self.stale = 0
+        self.peak_open = 0
+        self.max_g = 0
+        self.cost = float('inf')
+        self.setup_time = 0.0
+        self.search_time = 0.0
+        self.path_time = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={value!r}" for name, value in vars(self).items())
+        return f"SearchStats({fields})"
+
+
+# statistics of the path cache, see Map.cache_info()
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+# open lists the flat A* engine can use
+OPEN_LISTS = ("auto", "heap", "bucket", "indexed")
+
+# Map file format (see Map.save), all numbers little-endian:
+#   header:   magic, format version, rows, cols, start x/y, goal x/y, cost of each terrain code
+#   terrain:  rows * cols bytes, one terrain code per cell row after row, exactly like
+#             Map.terrain, so it can be memory-mapped and used as it is
+#   sections: any number of optional (4 byte tag, 8 byte length, data) blocks up to the end
+#             of the file. Readers skip tags they do not know, so new data can be added
+#             without breaking older files or older readers.
+MAP_MAGIC = b"MAPWORD\0"
+MAP_FORMAT_VERSION = 1
+MAP_HEADER = struct.Struct("<8sH2x6I4d")
+MAP_SECTION = struct.Struct("<4sQ")
+# landmark section: number of landmarks, table type code, then (x, y) of every landmark
+# and its distance table (see Map.build_landmarks)
+LANDMARK_TAG = b"LMRK"
+LANDMARK_HEADER = struct.Struct("<IB3x")
+LANDMARK_CELL = struct.Struct("<II")
+# distance table value of a cell that cannot reach the landmark
+UNREACHABLE = 0xFFFFFFFF
+
+# CompactPath.to_bytes(): start x, start y, cost, then one byte per run of moves
+COMPACT_PATH_HEADER = struct.Struct("<IId")
+
+
 class Map:     
     """
     Simple 2D world for the robot.
@@ -34,13 +773,59 @@ class Map:
     """
     
     # -->STEP 1: Initialize the map with rows and columns
-    def __init__(self, rows: int, cols:int) -> None: # self refer to the object being created, in this case the l object.
+    def __init__(self, rows: int, cols:int, terrain=None) -> None: # self refer to the object being created, in this case the l object.
         # number of rows and columns
         self.rows = rows
         self.cols = cols
 
-        # this will the grid (list of lists)
-        self.grid = []
+        # this will be the terrain, one byte (terrain code) per cell stored row after row,
+        # so cell (x, y) is at index x * cols + y. Every cell starts as normal terrain,
+        # unless existing terrain codes are given (any bytes-like buffer of rows * cols bytes).
+        if terrain is None:
+            terrain = array('B', bytes(rows * cols))
+        elif len(terrain) != rows * cols:
+            raise ValueError(f"terrain has {len(terrain)} cells, expected {rows * cols}")
+        self.terrain = terrain
+
+        # cost of entering each terrain code, looked up as self.costs[code].
+        # It is a tuple so it is only changed through set_costs(), which updates the caches
+        self._costs = tuple(TERRAIN_COSTS)
+
+        # terrain version, goes up by one every time the terrain changes
+        self.version = 0
+
+        # search data of the flat-index A* engine, built when first needed (see STEP 9b)
+        self._step = None          # entering cost of each cell of the padded grid, 0 = blocked
+        self._step_version = -1    # terrain version the step costs were built from
+        self._g = []               # g-score of each padded cell
+        self._parent = []          # parent padded index of each padded cell
+        self._seen = []            # generation in which g and parent were last written
+        self._generation = 0       # search counter, so the arrays never need clearing
+        self._score = []           # base - g of each padded cell, for _bucket_search()
+        self._score_base = 0       # base of the last _bucket_search()
+        self._open_lists = {}      # reusable BucketQueue / IndexedHeap by kind, see _open_list()
+
+        # functions called after every terrain change (see add_listener)
+        self._listeners = []
+
+        # connected components of the free cells, None until build_components() (see STEP 13)
+        self.components = None
+
+        # cached a_star() results, least recently used first, None until cache_paths() (see STEP 15)
+        self._paths = None
+        self._path_cache_size = 0
+        self._path_hits = 0
+        self._path_misses = 0
+
+        # landmarks for the ALT heuristic, None until build_landmarks() (see STEP 17)
+        self._landmarks = None          # (x, y) of every landmark
+        self._landmark_tables = []      # cost from every cell to each landmark
+        self._landmarks_version = -1    # terrain version the tables were made for
+
+        # cached distance fields by goal, least recently used first (see STEP 11)
+        self._fields = OrderedDict()
+        # memory the cached distance fields may use, in bytes
+        self.field_budget = 64 * 1024 * 1024
 
         # set start and goal positions and start at top-left
         # This is a tuple with row and column index
@@ -50,29 +835,129 @@ class Map:
         # goal at bottom-right
         # In this case have 10 rows and 10 columns so it will be 9,9, as indexing starts from 0 not 1
         self.goal = (rows - 1, cols - 1) 
+
+    @property
+    def grid(self):
+        """
+        Read-only view of the terrain as a list of lists of 'N', 'H', 'W', 'O'.
+        It is kept for compatibility, so to change a cell use set_terrain().
+        """
+        return _GridView(self)
+
+    @property
+    def costs(self) -> tuple:
+        """
+        Cost of entering each terrain code, as a tuple indexed by code.
+        To change it use set_costs().
+        """
+        return self._costs
+
+    def set_costs(self, costs) -> None:
+        """
+        Change the cost of entering each terrain code.
+        costs has one value per terrain code (NORMAL, HILL, WATER, OBSTACLE), every value
+        positive, float('inf') for a terrain that cannot be entered.
+        Like a regenerated terrain, every cache of the map and every listener is told
+        that the whole map changed.
+        """
+        costs = tuple(costs)
+        if len(costs) != len(TERRAIN_SYMBOLS):
+            raise ValueError(f"expected {len(TERRAIN_SYMBOLS)} costs, got {len(costs)}")
+        for cost in costs:
+            if not cost > 0:
+                raise ValueError(f"terrain costs must be positive, got {cost!r}")
+        if costs == self._costs:
+            return  # nothing changes
+
+        self._costs = costs
+        self.version += 1
+        self._notify(None, None)
+
+    def blocked_code(self, code: int) -> bool:
+        """
+        Return True if terrain code can not be entered, that is its cost is infinite.
+        This is the one definition of "blocked" used by the searches and the caches.
+        """
+        return self._costs[code] == float('inf')
+
+    def set_terrain(self, x: int, y: int, terrain) -> None:
+        """
+        Change the terrain of cell (x, y).
+        terrain can be a symbol ('N', 'H', 'W', 'O') or a terrain code (NORMAL, HILL, WATER, OBSTACLE).
+        """
+        if not self.in_bounds(x, y):
+            raise IndexError(f"cell {(x, y)} is outside the {self.rows}x{self.cols} grid")
+
+        # turn a symbol into its code
+        if isinstance(terrain, str):
+            if terrain not in TERRAIN_CODES:
+                raise ValueError(f"unknown terrain {terrain!r}, expected one of {TERRAIN_SYMBOLS}")
+            code = TERRAIN_CODES[terrain]
+        else:
+            code = terrain
+            if code < 0 or code >= len(TERRAIN_SYMBOLS):
+                raise ValueError(f"unknown terrain code {code!r}")
+
+        old_code = self.terrain[x * self.cols + y]
+        if code == old_code:
+            return  # nothing changes
+
+        # terrain loaded with Map.load(mmap=True) is a read-only view of the file,
+        # make a private copy the first time it is changed
+        if isinstance(self.terrain, memoryview) and self.terrain.readonly:
+            terrain = array('B')
+            terrain.frombytes(self.terrain)
+            self.terrain = terrain
+
+        self.terrain[x * self.cols + y] = code
+
+        # keep the flat engine step costs in line instead of rebuilding them
+        if self._step is not None and self._step_version == self.version:
+            self._step[(x + 1) * (self.cols + 2) + y + 1] = self._code_steps()[code]
+            self._step_version += 1
+        self.version += 1
+        self._notify((x, y), old_code)
+
+    def add_listener(self, callback) -> None:
+        """
+        Register callback(cell, old_code), called after every terrain change.
+        cell is the (x, y) that changed and old_code its terrain code before the change.
+        When the whole terrain is regenerated cell and old_code are None.
+        Planners and caches use it to keep their saved search data up to date.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback) -> None:
+        """
+        Stop calling a callback registered with add_listener().
+        """
+        self._listeners.remove(callback)
+
+    def _notify(self, cell, old_code) -> None:
+        # bring the caches of this map up to date, then tell every listener about the change
+        self._update_fields(cell, old_code)
+        self._update_paths(cell, old_code)
+        self._update_landmarks(cell, old_code)
+        for callback in list(self._listeners):
+            callback(cell, old_code)
         
     #--> STEP 2: Fill the grid with normal terrain 'N'
     def fill_grid(self):
             """
             Fill the grid with only normal terrain 'N'.
             """
-            # create with an empty list for the grid or reset the grid
-            self.grid = [] 
-            #iteration through each row index
-            for x in range(self.rows):
-                row_list = [] # create an empty list for each row
-                
-                # iteration through each column index
-                for y in range(self.cols):
-                    row_list.append('N') # append 'N' to the row list
-                    
-                self.grid.append(row_list) # append the row list to the grid
+            # create the terrain or reset it, a zero byte is normal terrain (code NORMAL)
+            self.terrain = array('B', bytes(self.rows * self.cols))
+            self.version += 1
+            self._notify(None, None)
     
     #--> STEP 2b: Fill the grid with random terrain types
     def fill_random_grid(self, n_prob: int = 65, 
                          h_prob:int = 15, 
                          w_prob:int = 10,
-                         o_prob:int = 10
+                         o_prob:int = 10,
+                         seed: int = None,
+                         chunk_rows: int = None
                          )-> None:
             """
             Fill the grid with random terrain:
@@ -82,6 +967,9 @@ class Map:
             - Some cells 'H' (hill) - h_prob %
             - Check if start and goal are not obstacles so they are not blocked.
             - Automatically balance probabilities if they don’t add up to 100%
+            - seed: the same seed always gives the same map (default: use the random module)
+            - chunk_rows: rows generated at a time (default: about a million cells),
+              only one chunk of random data is in memory at once
             """
             # check that the probability entered by user
             total_prob = n_prob + h_prob + w_prob + o_prob
@@ -100,37 +988,57 @@ class Map:
                 h_prob = int(h_prob * scale)
                 w_prob = int(w_prob * scale)
                 o_prob = int(o_prob * scale) 
-                
-                
-            self.grid = [] # create with an empty list for the grid or reset the grid
+
+            # Each cell gets a random number between 1 and 100 and the range it falls
+            # into decides the terrain, as before, but whole chunks of cells at once:
+            # random bytes 0-199 are turned into numbers 1-100 (byte % 100 + 1) and then
+            # into terrain codes by one bytes.translate() call, bytes 200-255 are dropped
+            # so every number stays equally likely.
+            table = bytearray(256)
+            for byte in range(200):
+                rand_num = byte % 100 + 1
+                if rand_num <= n_prob:
+                    table[byte] = NORMAL
+                elif rand_num <= n_prob + h_prob:
+                    table[byte] = HILL
+                elif rand_num <= n_prob + h_prob + w_prob:
+                    table[byte] = WATER
+                else:
+                    table[byte] = OBSTACLE
+            table = bytes(table)
+            dropped = bytes(range(200, 256))
+
+            randbytes = random.randbytes if seed is None else random.Random(seed).randbytes
+            block = 1 << 16  # random bytes are always drawn in blocks of this size, so the
+                             # map for a seed does not depend on chunk_rows
+            spare = b''
+
+            if chunk_rows is None:
+                chunk_rows = max(1, (1 << 20) // max(1, self.cols))
+
+            terrain = array('B', bytes(self.rows * self.cols)) # create the terrain or reset it
+            cells = memoryview(terrain)
             
-            # iteration through each row index
-            for x in range(self.rows):
-                row_list = [] # create an empty list for each row
-                
-                # iteration through each column index
-                for y in range(self.cols):
-                    # choose a random number between 1 and 100
-                    rand_num = random.randint(1, 100)
-                    
-                    #decide terrain type based on random number
-                    # check which range the random number falls into 
-                    if rand_num <= n_prob:
-                        terrain_type = 'N'
-                    elif rand_num <= n_prob + h_prob:
-                        terrain_type = 'H'
-                    elif rand_num <= n_prob + h_prob + w_prob:
-                        terrain_type = 'W'
-                    else:
-                        terrain_type = f"{RED}O{RESET}"
-                    
-                    row_list.append(terrain_type) # append the terrain type to the current row list
+            # iteration through each chunk of rows
+            for first_row in range(0, self.rows, chunk_rows):
+                begin = first_row * self.cols
+                end = min(self.rows, first_row + chunk_rows) * self.cols
+
+                # terrain codes for this chunk, plus what is left over for the next one
+                codes = spare
+                while len(codes) < end - begin:
+                    codes += randbytes(block).translate(table, dropped)
+                cells[begin:end] = codes[:end - begin]
+                spare = codes[end - begin:]
+            cells.release()
                     
-                self.grid.append(row_list) # append the row list to the grid
-                
             # make sure start and goal are not obstacles
-            self.grid[self.start[0]][self.start[1]] = 'N'  # set start position to 'N'
-            self.grid[self.goal[0]][self.goal[1]] = 'N'    # set goal position to 'N'
+            terrain[self.start[0] * self.cols + self.start[1]] = NORMAL  # set start position to 'N'
+            terrain[self.goal[0] * self.cols + self.goal[1]] = NORMAL    # set goal position to 'N'
+
+            self.terrain = terrain
+            self.version += 1
+            self._notify(None, None)
   
      
     #--> STEP 3: Print the grid to the console
@@ -139,6 +1047,7 @@ class Map:
             Print the grid to the console.
             Start will be'S' and Goal will be 'G'.
             """
+            terrain = self.terrain
             # iterate through each row index
             for x in range (self.rows):
                 # iterate through each column of the row index
@@ -154,48 +1063,97 @@ class Map:
                     # else print what else is in the grid at that position, in this will be 'N'
                     #Then also 'O', 'W' or 'H'
                     else:
-                        print(self.grid[x][y], end=' ')
+                        print(TERRAIN_DISPLAY[terrain[x * self.cols + y]], end=' ')
                         
                 print()  # new line after each row
                 
     #--> STEP 3b( but step 10 for me): Animate the robot moving along a path         
-    def animate_path(self, path, delay=0.3):
+    def animate_path(self, path, delay=0.3, view: tuple = None, out=None):
         """
         Animate robot movement step-by-step.
         Shows:
         🤖 = robot current position
         * = path already visited
+        The frame is drawn once, after that each step only moves the cursor to the
+        cells that changed and redraws them, with one write per frame.
+        -view: (rows, cols) shown at once, the view scrolls with the robot on big maps
+               (default: as much of the map as fits in the terminal)
+        -out: where to draw (default sys.stdout)
         """
+        out = sys.stdout if out is None else out
+        if view is None:
+            size = shutil.get_terminal_size()
+            view = (size.lines - 6, size.columns // 2)  # leave room for the header and the prompt
+        view_rows = max(1, min(self.rows, view[0]))
+        view_cols = max(1, min(self.cols, view[1]))
+        header = 4  # lines above the grid: blank, ====, robot step, ====
+
         visited = set()  # will store teh cell already travelled cells
+        terrain = self.terrain
+        robot = None
+        top = left = None  # first row and column shown, None until the first frame
 
+        # every cell takes two screen columns, the robot emoji is two columns wide itself
+        def cell(x, y):
+            if (x, y) == self.start:
+                return f"{YELLOW}S{RESET} "
+            elif (x, y) == self.goal:
+                return f"{MAGENTA}G{RESET} "
+            elif (x, y) == robot:
+                return "🤖"
+            elif (x, y) in visited:
+                return f"{GREEN}*{RESET} "
+            return TERRAIN_DISPLAY[terrain[x * self.cols + y]] + " "
+
+        # ANSI escape moving the cursor to a cell inside the view (rows and columns count from 1)
+        def place(x, y):
+            return f"\033[{header + 1 + x - top};{2 * (y - left) + 1}H"
+
+        out.write("\033[?25l")  # hide the cursor while drawing
         for step in path:
-            x_pos, y_pos = step
+            step = tuple(step)
+            previous = robot
+            robot = step
             visited.add(step)  # add the current step to visited set(path)
+            x_pos, y_pos = step
+            frame = []
 
-            os.system('cls' if os.name == 'nt' else 'clear')  # clear console for animation effect
-            
-            print("\n====================")
-            print(" Robot step:", step)
-            print("====================")
-
-            for x in range(self.rows):
-                for y in range(self.cols):
-                    if (x, y) == self.start:
-                        print(f"{YELLOW}S{RESET}", end=" ")
-                    elif (x, y) == self.goal:
-                        print(f"{MAGENTA}G{RESET}", end=" ")
-                    elif (x, y) == (x_pos, y_pos):
-                        print("🤖", end=" ")
-                    elif (x, y) in visited:
-                        print(f"{GREEN}*{RESET}", end=" ")
-                    else:
-                        print(self.grid[x][y], end=" ")
-                print()  # move to next line after each row
+            # keep the robot away from the edges of the view, when it gets too close
+            # move the view so the robot is in the middle again
+            new_top = min(max(0, x_pos - view_rows // 2), self.rows - view_rows)
+            new_left = min(max(0, y_pos - view_cols // 2), self.cols - view_cols)
+            # a side of the view on the edge of the map cannot scroll further, so it has no margin
+            if top is not None:
+                margin_x = view_rows // 4
+                margin_y = view_cols // 4
+                low_x = top + margin_x if top > 0 else 0
+                high_x = top + view_rows - margin_x if top + view_rows < self.rows else self.rows
+                low_y = left + margin_y if left > 0 else 0
+                high_y = left + view_cols - margin_y if left + view_cols < self.cols else self.cols
+            if top is None or ((new_top, new_left) != (top, left)
+                               and not (low_x <= x_pos < high_x and low_y <= y_pos < high_y)):
+                # first frame or scrolling: draw the whole view
+                top, left = new_top, new_left
+                frame.append("\033[2J\033[H\n====================\n\n====================\n")
+                for x in range(top, top + view_rows):
+                    frame.append("".join(cell(x, y) for y in range(left, left + view_cols)))
+                    frame.append("\n")
+            else:
+                # only the cell the robot left and the cell it entered change
+                if previous is not None:
+                    frame.append(place(*previous) + cell(*previous))
+                frame.append(place(*step) + cell(*step))
+
+            frame.append(f"\033[3;1H Robot step: {step}\033[K")
+            out.write("".join(frame))
+            out.flush()
 
             time.sleep(delay)
 
-      
-      
+        # put the cursor back under the grid for what is printed next
+        out.write(f"\033[{header + view_rows + 1};1H\033[?25h")
+        out.flush()
+
     #--> STEP 4: Check if a position is inside the grid boundaries       
     def in_bounds(self, x:int, y:int) -> bool:
         """
@@ -222,8 +1180,8 @@ class Map:
         if not self.in_bounds(x, y):
             return True   # outside = which is also an obstacle for pathfinding logic
 
-        # Now check if the terrain at this cell is an obstacle 'O'
-        if 'O' in self.grid[x][y]:
+        # Now check if the terrain at this cell can not be entered, like an obstacle 'O'
+        if self.blocked_code(self.terrain[x * self.cols + y]):
             return True   # actual obstacle
 
         # Otherwise the cell is free to move into
@@ -266,20 +1224,9 @@ class Map:
         Returns: int cost value -> 1 (normal), 3 (hill), 5 (water), inf (obstacle)
         """
 
-        # get the terrain type at this position
-        terrain = self.grid[x][y]
-
-        # check the terrain and return the cost
-        if terrain == 'N':
-            return 1  
-        elif terrain == 'H':
-            return 3 
-        elif terrain == 'W':
-            return 5 
-        else:
-            # For 'O' (obstacle) or any unknown symbol
-            # we return infinite cost, which means "do not go there".
-            return float('inf')
+        # look up the terrain code of this position in the cost table
+        # For 'O' (obstacle) the table holds infinite cost, which means "do not go there".
+        return self._costs[self.terrain[x * self.cols + y]]
 
 
     #--> STEP 8: Heuristic function for A* algorithm
@@ -304,7 +1251,8 @@ class Map:
         return distance
 
     #--> STEP 9: A* Algorithm implementation
-    def a_star(self, weight:float= 1.0) -> list:
+    def a_star(self, weight:float= 1.0, engine: str = "flat", open_list: str = "auto",
+               stats: SearchStats = None, on_expand=None, compact: bool = False) -> list:
         """
         A* (A-star) Algorithm pathfinder.
         Finds the lowest-cost path from start to goal,
@@ -313,6 +1261,127 @@ class Map:
          -h(n): estimated cost from n to goal (heuristic)
          -weight: heuristic weight. Values > 1 make it greedier (faster but less optimal).
          -The finl cost is : f(n) = g(n) + weight * h(n)
+         -engine: "flat" (default) searches on flat cell indices with reusable arrays (STEP 9b),
+                  "grid" is the original search keyed by (row, col) tuples (STEP 9a).
+                  Both give the same path with open_list="heap".
+                  "bidirectional" searches from the start and from the goal at once and
+                  stops where they meet (STEP 9d), a path of the same cost at w = 1.
+         -open_list: priority queue of the flat engine.
+                  "heap"    binary heap (heapq), outdated entries are skipped when popped
+                  "bucket"  bucket queue, O(1) operations, needs integer priorities
+                            (integer weight and terrain costs)
+                  "indexed" binary heap with decrease-key, one entry per cell at most
+                  "auto"    (default) "bucket" when priorities are integers, else "heap"
+                  Every open list finds a path of the same cost, ties may be broken differently.
+         -stats: a SearchStats to fill with the counters of this search (flat engine only).
+         -on_expand: function called as on_expand((x, y), g) for every expanded cell, in
+                 the order of expansion, for example to draw the explored frontier
+                 (flat engine only).
+                 Counting and callbacks run in a separate copy of the search loop, so
+                 a_star() without them pays nothing for either.
+         -compact: return a CompactPath (start cell + run-length encoded moves, with the
+                 cost from the search) instead of a list of (x, y). The flat engine builds
+                 it straight from its parent array; iterate it or call to_list() for cells.
+        When the connectivity index is built (build_components()) a goal in another
+        component is rejected straight away, without searching.
+        When the path cache is on (cache_paths()) a query asked before is answered from
+        the cache, unless stats or on_expand ask to watch the search.
+        Returns path as a list of (x, y) (a CompactPath with compact) or None if no path is found.
+        """
+        cached = self._paths is not None and stats is None and on_expand is None
+        if cached:
+            key = (self.start, self.goal, weight, engine, open_list)
+            entry = self._paths.get(key)
+            if entry is not None and entry[3] == self.version:
+                self._paths.move_to_end(key)
+                self._path_hits += 1
+                if entry[0] is None:
+                    path = None
+                elif compact:
+                    path = CompactPath.from_cells(entry[0], entry[1])
+                else:
+                    path = list(entry[0])
+                if path is None:
+                    print("\nNo valid path found — the goal is unreachable due to obstacles or blocked terrain.")
+                return path
+            self._path_misses += 1
+
+        if self.components is not None and not self.components.connected(self.start, self.goal):
+            path = None
+        elif engine == "flat":
+            path = self._flat_a_star(self.start, self.goal, weight, open_list, stats, on_expand, compact)
+        elif stats is not None or on_expand is not None:
+            raise ValueError("search stats and on_expand are only supported by the flat engine")
+        elif engine == "grid":
+            path = self._grid_a_star(weight)
+        elif engine == "bidirectional":
+            path = self._bidirectional_a_star(self.start, self.goal, weight)
+        else:
+            raise ValueError(f"unknown engine {engine!r}, expected 'flat', 'grid' or 'bidirectional'")
+
+        if compact and isinstance(path, list):
+            # the other engines build lists, encode them afterwards
+            path = CompactPath.from_cells(path, world=self)
+
+        if cached:
+            self._store_path(key, path.to_list() if compact and path is not None else path)
+
+        # If goal never reached
+        if path is None:
+            print("\nNo valid path found — the goal is unreachable due to obstacles or blocked terrain.")
+        return path
+
+    #--> STEP 9c: Many start/goal queries at once
+    def solve_many(self, pairs, weight: float = 1.0, workers: int = None,
+                   ordered: bool = True, chunksize: int = 64):
+        """
+        Find paths for many (start, goal) pairs, spread over a pool of worker processes.
+        The terrain is copied once into shared memory and every worker attaches to it,
+        so the grid is not pickled for each query.
+         -pairs: iterable of ((start_x, start_y), (goal_x, goal_y)), it can be a generator
+         -weight: heuristic weight, same as a_star()
+         -workers: number of processes (default: all cores), 1 solves in this process
+         -ordered: True gives results in the order of pairs, False as soon as they are done
+         -chunksize: number of queries sent to a worker at a time
+        Yields (start, goal, path) for every pair, path as returned by a_star() (None if unreachable).
+        Changes to the terrain made while iterating are not seen by the workers.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        # check every query before it is sent, without reading the whole iterable first
+        def queries():
+            for start, goal in pairs:
+                start, goal = tuple(start), tuple(goal)
+                if not self.in_bounds(*start) or not self.in_bounds(*goal):
+                    raise IndexError(f"query {start} -> {goal} is outside the {self.rows}x{self.cols} grid")
+                yield start, goal, weight
+
+        if workers <= 1:
+            for start, goal, _ in queries():
+                yield start, goal, self._flat_a_star(start, goal, weight)
+            return
+
+        # one shared copy of the terrain for all workers
+        memory = shared_memory.SharedMemory(create=True, size=max(1, self.rows * self.cols))
+        try:
+            memory.buf[:self.rows * self.cols] = bytes(self.terrain)
+            with Pool(workers, initializer=_attach_worker,
+                      initargs=(memory.name, self.rows, self.cols, list(self.costs))) as pool:
+                if ordered:
+                    results = pool.imap(_solve_query, queries(), chunksize)
+                else:
+                    results = pool.imap_unordered(_solve_query, queries(), chunksize)
+                for result in results:
+                    yield result
+        finally:
+            memory.close()
+            memory.unlink()
+
+    #--> STEP 9a: A* on (row, col) tuples
+    def _grid_a_star(self, weight: float) -> list:
+        """
+        The original A* search, with dictionaries keyed by (row, col) tuples.
         Returns path as a list of (x, y) or None if no path is found.
         """
 
@@ -336,7 +1405,8 @@ class Map:
             current_priority, (row, col) = heapq.heappop(priority_queue)
 
             # Skip if this is an outdated entry with higher cost
-            if current_priority > cost_so_far[(row, col)] + self.heuristic(row, col):
+            # (the priority was made with the weighted heuristic, so compare with the same formula)
+            if current_priority > cost_so_far[(row, col)] + weight * self.heuristic(row, col):
                 continue
 
             # Stop if we reached the goal
@@ -371,7 +1441,6 @@ class Map:
 
         # If goal never reached
         if goal not in parent:
-            print("\nNo valid path found — the goal is unreachable due to obstacles or blocked terrain.")
             return None
 
         # Rebuild the final path from goal back to start
@@ -384,3 +1453,1359 @@ class Map:
 
         path.reverse()
         return path
+
+    #--> STEP 9b: A* on flat cell indices
+    def _step_costs(self) -> list:
+        """
+        Return the entering cost of every cell of the padded grid.
+        The padded grid has one extra blocked row/column on each side, so cell (x, y)
+        is at index (x + 1) * (cols + 2) + (y + 1) and the 4 neighbours of any index i
+        are always i - (cols + 2), i + (cols + 2), i - 1, i + 1 (no bounds check needed).
+        Blocked cells (obstacles and the border) have cost 0.
+        """
+        if self._step is not None and self._step_version == self.version:
+            return self._step
+
+        width = self.cols + 2
+        code_cost = self._code_steps()
+
+        # top border row, then every map row between two border cells, then bottom border row
+        step = [0] * width
+        terrain = self.terrain
+        for x in range(self.rows):
+            row_start = x * self.cols
+            step.append(0)
+            step.extend([code_cost[code] for code in terrain[row_start:row_start + self.cols]])
+            step.append(0)
+        step.extend([0] * width)
+
+        self._step = step
+        self._step_version = self.version
+        return step
+
+    def _code_steps(self) -> list:
+        """
+        Entering cost of each terrain code as the step costs hold it: 0 for a blocked
+        code, and whole numbers as int even when the table has floats (1.0 from a
+        loaded map, say), so g and f stay integers and can index the bucket queue.
+        """
+        return [0 if self.blocked_code(code) else int(cost) if float(cost).is_integer() else cost
+                for code, cost in enumerate(self.costs)]
+
+    def _open_list_kind(self, weight: float, open_list: str) -> str:
+        """
+        Resolve the open_list argument of a_star() to "heap", "bucket" or "indexed".
+        """
+        if open_list not in OPEN_LISTS:
+            raise ValueError(f"unknown open list {open_list!r}, expected one of {OPEN_LISTS}")
+
+        # f = g + w * h only takes integer values when w and every terrain cost are whole
+        # numbers, the step costs and the bucket searches turn them into int
+        integer_priorities = float(weight).is_integer() and all(
+            isinstance(cost, int) for cost in self._code_steps())
+
+        if open_list == "auto":
+            return "bucket" if integer_priorities else "heap"
+        if open_list == "bucket" and not integer_priorities:
+            raise ValueError("the bucket open list needs an integer weight and integer terrain costs")
+        return open_list
+
+    def _flat_a_star(self, start: tuple, goal: tuple, weight: float, open_list: str = "auto",
+                     stats: SearchStats = None, on_expand=None, compact: bool = False) -> list:
+        """
+        Weighted A* from start to goal on flat cell indices.
+        g-scores and parents live in preallocated lists that are reused between calls:
+        each search gets a new generation number and a cell's g/parent only count when
+        its seen-mark equals the current generation, so nothing has to be cleared.
+        open_list chooses the priority queue, see a_star().
+        stats and on_expand, when given, are served by the counting copy of the search
+        (_counted_search).
+        Returns path as a list of (x, y), or a CompactPath with compact, or None if no
+        path is found.
+        """
+        if stats is not None or on_expand is not None:
+            began = time.perf_counter()
+        kind = self._open_list_kind(weight, open_list)
+        step = self._step_costs()
+        width = self.cols + 2
+
+        # grow the reusable arrays if the padded grid got bigger
+        size = len(step)
+        if len(self._g) < size:
+            self._g = [0] * size
+            self._parent = [-1] * size
+            self._seen = [0] * size
+        g = self._g
+        parent = self._parent
+        seen = self._seen
+        self._generation += 1
+        generation = self._generation
+
+        # neighbour offset table: up, down, left, right
+        offsets = (-width, width, -1, 1)
+
+        # padded indices of start and goal
+        source = (start[0] + 1) * width + start[1] + 1
+        target = (goal[0] + 1) * width + goal[1] + 1
+        goal_row, goal_col = goal[0] + 1, goal[1] + 1
+
+        g[source] = 0
+        parent[source] = -1
+        seen[source] = generation
+
+        if stats is not None or on_expand is not None:
+            if stats is None:
+                stats = SearchStats()
+            stats.setup_time = time.perf_counter() - began
+            return self._counted_search(kind, source, target, weight, generation, stats, on_expand,
+                                        compact=compact)
+
+        if self._landmarks is not None and weight:
+            # the landmark heuristic is a function call per cell, it runs in the loop that
+            # takes a heuristic function
+            return self._counted_search(kind, source, target, weight, generation,
+                                        SearchStats(), heuristic=self._landmark_heuristic(goal),
+                                        compact=compact)
+
+        if kind == "bucket":
+            return self._bucket_search(source, target, int(weight), generation, compact)
+
+        if kind != "heap":
+            # decrease-key heap: the queue itself never returns an outdated entry,
+            # so no check is needed after pop
+            queue = self._open_list(kind, size)
+            push = queue.push
+            pop = queue.pop
+            push(source, 0)
+
+            while queue:
+                _, current = pop()
+                if current == target:
+                    break
+
+                current_g = g[current]
+                for offset in offsets:
+                    neighbour = current + offset
+                    cost = step[neighbour]
+                    if not cost:
+                        continue  # obstacle or border
+
+                    new_cost = current_g + cost
+                    if seen[neighbour] != generation or new_cost < g[neighbour]:
+                        seen[neighbour] = generation
+                        g[neighbour] = new_cost
+                        parent[neighbour] = current
+
+                        row, col = divmod(neighbour, width)
+                        push(neighbour, new_cost + weight * (abs(row - goal_row) + abs(col - goal_col)))
+
+            return self._flat_path(target, generation, compact)
+
+        # heap entries are (f, index, g). Ties on f are broken by index, which is the
+        # same row-major order as the (row, col) tuples of the grid engine.
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        priority_queue = [(0, source, 0)]
+
+        while priority_queue:
+            _, current, current_g = heappop(priority_queue)
+
+            # Skip outdated entries: a cheaper g was found after this one was pushed.
+            # Comparing g (not f) keeps the check right for every weight.
+            if current_g > g[current]:
+                continue
+
+            if current == target:
+                break
+
+            for offset in offsets:
+                neighbour = current + offset
+                cost = step[neighbour]
+                if not cost:
+                    continue  # obstacle or border
+
+                new_cost = current_g + cost
+                if seen[neighbour] != generation or new_cost < g[neighbour]:
+                    seen[neighbour] = generation
+                    g[neighbour] = new_cost
+                    parent[neighbour] = current
+
+                    row, col = divmod(neighbour, width)
+                    priority = new_cost + weight * (abs(row - goal_row) + abs(col - goal_col))
+                    heappush(priority_queue, (priority, neighbour, new_cost))
+
+        return self._flat_path(target, generation, compact)
+
+    def _bucket_search(self, source: int, target: int, weight: int, generation: int,
+                       compact: bool = False) -> list:
+        """
+        The search loop of _flat_a_star() for the bucket open list, the default at
+        integer weights, with the bucket queue written into the loop instead of
+        BucketQueue method calls. It keeps one number per cell instead of g and
+        seen: score = base - g, where base grows by more than any g with every
+        search, so a cell not reached by this search always has a lower score than
+        any g of this search gives, and "unseen or cheaper" is one comparison.
+        Only the parents and the target's g/seen are written to the shared arrays,
+        which is all _flat_path() needs.
+        """
+        step = self._step
+        size = len(step)
+        width = self.cols + 2
+        parent = self._parent
+        if len(self._score) < size:
+            self._score = [0] * size
+        score = self._score
+        largest = max(step)
+        base = self._score_base + largest * size + 1  # above every score of earlier searches
+        self._score_base = base
+
+        goal_row, goal_col = divmod(target, width)
+        # neighbour offset table with the row and column change of each move
+        moves = ((-width, -1, 0), (width, 1, 0), (-1, 0, -1), (1, 0, 1))
+
+        # bucket f holds the cells pushed with priority f. A neighbour's f is at most
+        # reach above the f of the cell expanded, so the buckets only have to reach
+        # that far past the lowest one.
+        reach = largest + weight
+        row, col = divmod(source, width)
+        lowest = weight * (abs(row - goal_row) + abs(col - goal_col))
+        buckets = [[] for _ in range(lowest + reach + 1)]
+        buckets[lowest].append(source)
+        score[source] = base
+        queued = 1
+
+        while queued:
+            bucket = buckets[lowest]
+            if not bucket:
+                lowest += 1
+                if lowest + reach >= len(buckets):
+                    buckets.append([])
+                continue
+            current = bucket.pop()
+            queued -= 1
+
+            row, col = divmod(current, width)
+            d_row = row - goal_row
+            d_col = col - goal_col
+            current_score = score[current]
+            current_g = base - current_score
+            # outdated entry: the cell was pushed again with a lower g (and so a lower f)
+            if current_g + weight * (abs(d_row) + abs(d_col)) != lowest:
+                continue
+            if current == target:
+                break
+
+            for offset, m_row, m_col in moves:
+                neighbour = current + offset
+                cost = step[neighbour]
+                if cost and current_score - cost > score[neighbour]:  # 0 = obstacle or border
+                    score[neighbour] = current_score - cost
+                    parent[neighbour] = current
+                    priority = current_g + cost + weight * (abs(d_row + m_row) + abs(d_col + m_col))
+                    buckets[priority].append(neighbour)
+                    queued += 1
+                    # priorities can go down with an inflated heuristic (w > 1)
+                    if priority < lowest:
+                        lowest = priority
+
+        if score[target] <= base - largest * size - 1:
+            return None  # never reached in this search
+        self._g[target] = base - score[target]
+        self._seen[target] = generation
+        return self._flat_path(target, generation, compact)
+
+    def _open_list(self, kind: str, size: int):
+        """
+        Empty BucketQueue ("bucket") or IndexedHeap ("indexed") for size items.
+        One of each is kept and cleared between searches, like the g/parent arrays,
+        so a query does not build a table over the whole grid every time.
+        """
+        queue = self._open_lists.get(kind)
+        if queue is None or queue.size < size:
+            queue = BucketQueue(size) if kind == "bucket" else IndexedHeap(size)
+            self._open_lists[kind] = queue
+        else:
+            queue.clear()
+        return queue
+
+    def _counted_search(self, kind: str, source: int, target: int, weight: float,
+                        generation: int, stats: SearchStats, on_expand=None,
+                        heuristic=None, compact: bool = False) -> list:
+        """
+        The search loop of _flat_a_star(), for every open list, with counters and
+        the on_expand callback. It is kept apart so the normal loop has neither.
+        heuristic(padded index) replaces the Manhattan distance when given, the
+        landmark heuristic is used this way (STEP 17).
+        """
+        began = time.perf_counter()
+        step = self._step
+        g = self._g
+        parent = self._parent
+        seen = self._seen
+        width = self.cols + 2
+        offsets = (-width, width, -1, 1)
+        goal_row, goal_col = divmod(target, width)
+
+        # the heap keeps outdated entries, the other open lists replace them
+        use_heap = kind == "heap"
+        if use_heap:
+            priority_queue = [(0, source, 0)]
+        else:
+            if kind == "bucket":
+                weight = int(weight)
+            queue = self._open_list(kind, len(step))
+            queue.push(source, 0)
+        stats.pushes = 1
+        stats.peak_open = 1
+        if heuristic is None and self._landmarks is not None and weight:
+            heuristic = self._landmark_heuristic((goal_row - 1, goal_col - 1))
+
+        while True:
+            if use_heap:
+                if not priority_queue:
+                    break
+                _, current, current_g = heapq.heappop(priority_queue)
+                if current_g > g[current]:
+                    stats.stale += 1
+                    continue
+            else:
+                if not queue:
+                    break
+                _, current = queue.pop()
+                current_g = g[current]
+
+            if current == target:
+                break
+            stats.expanded += 1
+            if current_g > stats.max_g:
+                stats.max_g = current_g
+            if on_expand is not None:
+                row, col = divmod(current, width)
+                on_expand((row - 1, col - 1), current_g)
+
+            for offset in offsets:
+                neighbour = current + offset
+                cost = step[neighbour]
+                if not cost:
+                    continue  # obstacle or border
+
+                new_cost = current_g + cost
+                if seen[neighbour] != generation or new_cost < g[neighbour]:
+                    seen[neighbour] = generation
+                    g[neighbour] = new_cost
+                    parent[neighbour] = current
+
+                    if heuristic is None:
+                        row, col = divmod(neighbour, width)
+                        priority = new_cost + weight * (abs(row - goal_row) + abs(col - goal_col))
+                    else:
+                        estimate = heuristic(neighbour)
+                        if estimate == float('inf'):
+                            continue  # it cannot reach the goal, never worth expanding
+                        priority = new_cost + weight * estimate
+                    stats.pushes += 1
+                    if use_heap:
+                        heapq.heappush(priority_queue, (priority, neighbour, new_cost))
+                        size = len(priority_queue)
+                    else:
+                        queue.push(neighbour, priority)
+                        size = len(queue)
+                    if size > stats.peak_open:
+                        stats.peak_open = size
+
+        if kind == "bucket":
+            stats.stale = queue.skipped  # the bucket queue skips them inside pop()
+        if seen[target] == generation:
+            stats.cost = g[target]
+        finished = time.perf_counter()
+        stats.search_time = finished - began
+
+        path = self._flat_path(target, generation, compact)
+        stats.path_time = time.perf_counter() - finished
+        return path
+
+    def _flat_path(self, target: int, generation: int, compact: bool = False) -> list:
+        """
+        Rebuild the path to a padded index from the parents of a flat search,
+        or return None if the search never reached it.
+        With compact it is a CompactPath instead of a list (_flat_compact_path()).
+        """
+        if self._seen[target] != generation:
+            return None
+        if compact:
+            return self._flat_compact_path(target)
+
+        width = self.cols + 2
+        parent = self._parent
+        path = []
+        current = target
+        while current != -1:
+            row, col = divmod(current, width)
+            path.append((row - 1, col - 1))
+            current = parent[current]
+
+        path.reverse()
+        return path
+
+    def _flat_compact_path(self, target: int) -> CompactPath:
+        """
+        Rebuild the path to a padded index as a CompactPath, straight from the parents:
+        no (x, y) tuple is made for the cells in between, and the cost is g of the target.
+        """
+        width = self.cols + 2
+        parent = self._parent
+        # (cell - its parent) -> index in DIRECTIONS of the move into the cell
+        direction_of = {-width: 0, width: 1, -1: 2, 1: 3}
+
+        # runs of the same direction, from the target back to the start
+        runs = []
+        current = target
+        while parent[current] != -1:
+            previous = parent[current]
+            direction = direction_of[current - previous]
+            if runs and runs[-1][0] == direction:
+                runs[-1][1] += 1
+            else:
+                runs.append([direction, 1])
+            current = previous
+
+        moves = bytearray()
+        for direction, run in reversed(runs):
+            while run > 0:
+                part = min(run, CompactPath.MAX_RUN)
+                moves.append(direction << 6 | (part - 1))
+                run -= part
+
+        row, col = divmod(current, width)
+        return CompactPath((row - 1, col - 1), moves, self._g[target])
+
+
+    #--> STEP 9d: Bidirectional A*
+    def _bidirectional_a_star(self, start: tuple, goal: tuple, weight: float) -> list:
+        """
+        Weighted A* from the start and from the goal at the same time, on flat indices.
+        The cost is paid when entering a cell, so the two directions are not the same:
+          forward:  g_f(n) = g_f(v) + cost(n)   (moving from v into n)
+          backward: g_b(v) = g_b(n) + cost(n)   (v is before n on the path, n is entered)
+        mu is the cost of the best path found so far through a cell reached from both
+        sides. With heuristics that never overestimate (w <= 1), once the smallest f of
+        either open list is at least mu no path through it can be cheaper, so the search
+        stops with the cheapest path.
+        The side with the smaller open list is expanded next.
+        Returns path as a list of (x, y) or None if no path is found.
+        """
+        step = self._step_costs()
+        width = self.cols + 2
+        inf = float('inf')
+        offsets = (-width, width, -1, 1)
+
+        source = (start[0] + 1) * width + start[1] + 1
+        target = (goal[0] + 1) * width + goal[1] + 1
+        if source == target:
+            return [tuple(start)]
+        if not step[target]:
+            return None  # the goal is an obstacle and can never be entered
+
+        # Manhattan distance times the cheapest cost, a lower bound in both directions
+        cheapest = min((cost for cost in step if cost), default=1)
+        start_row, start_col = divmod(source, width)
+        goal_row, goal_col = divmod(target, width)
+
+        # per direction: g-scores, parents (next cell towards the own root) and open list
+        g_forward, g_backward = {source: 0}, {target: 0}
+        parent_forward, parent_backward = {source: -1}, {target: -1}
+        open_forward = [(weight * cheapest * (abs(start_row - goal_row) + abs(start_col - goal_col)), source, 0)]
+        open_backward = [(open_forward[0][0], target, 0)]
+
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        best = inf      # mu, cost of the best path found
+        meeting = -1    # cell where that path joins the two searches
+
+        while open_forward and open_backward:
+            # drop outdated entries so the smallest f of each side is a live one
+            while open_forward and open_forward[0][2] > g_forward[open_forward[0][1]]:
+                heappop(open_forward)
+            while open_backward and open_backward[0][2] > g_backward[open_backward[0][1]]:
+                heappop(open_backward)
+            if not open_forward or not open_backward:
+                break
+            if open_forward[0][0] >= best or open_backward[0][0] >= best:
+                break  # nothing left can beat the best path
+
+            forward = len(open_forward) <= len(open_backward)
+            if forward:
+                _, current, current_g = heappop(open_forward)
+                for offset in offsets:
+                    neighbour = current + offset
+                    cost = step[neighbour]
+                    if not cost:
+                        continue  # obstacle or border
+                    new_cost = current_g + cost
+                    if new_cost < g_forward.get(neighbour, inf):
+                        g_forward[neighbour] = new_cost
+                        parent_forward[neighbour] = current
+                        row, col = divmod(neighbour, width)
+                        h = cheapest * (abs(row - goal_row) + abs(col - goal_col))
+                        heappush(open_forward, (new_cost + weight * h, neighbour, new_cost))
+                        # reached by the backward search too: a full path
+                        if neighbour in g_backward and new_cost + g_backward[neighbour] < best:
+                            best = new_cost + g_backward[neighbour]
+                            meeting = neighbour
+            else:
+                _, current, current_g = heappop(open_backward)
+                # every cell before this one pays this cell's entering cost
+                new_cost = current_g + step[current]
+                for offset in offsets:
+                    neighbour = current + offset
+                    # the start may be an obstacle, the robot can still leave it
+                    if not step[neighbour] and neighbour != source:
+                        continue
+                    if new_cost < g_backward.get(neighbour, inf):
+                        g_backward[neighbour] = new_cost
+                        parent_backward[neighbour] = current
+                        row, col = divmod(neighbour, width)
+                        h = cheapest * (abs(row - start_row) + abs(col - start_col))
+                        heappush(open_backward, (new_cost + weight * h, neighbour, new_cost))
+                        if neighbour in g_forward and g_forward[neighbour] + new_cost < best:
+                            best = g_forward[neighbour] + new_cost
+                            meeting = neighbour
+
+        if meeting < 0:
+            return None
+
+        # start ... meeting from the forward parents, then meeting ... goal from the backward ones
+        cells = []
+        current = meeting
+        while current != -1:
+            cells.append(current)
+            current = parent_forward[current]
+        cells.reverse()
+        current = parent_backward[meeting]
+        while current != -1:
+            cells.append(current)
+            current = parent_backward[current]
+        return [(cell // width - 1, cell % width - 1) for cell in cells]
+
+
+    #--> STEP 11: Goal distance fields
+    def distance_field(self, goal: tuple = None) -> DistanceField:
+        """
+        Return the distance field of a goal (default self.goal): the cost from every
+        cell to that goal and the next step on the cheapest path, made with one
+        reverse Dijkstra search.
+        Fields are cached, least recently used ones are dropped when they take more
+        than field_budget bytes, and they are kept up to date when the terrain changes.
+        Use distance_field(goal).path(start, self) to answer queries for a shared goal.
+        """
+        goal = tuple(self.goal if goal is None else goal)
+        if not self.in_bounds(*goal):
+            raise IndexError(f"goal {goal} is outside the {self.rows}x{self.cols} grid")
+
+        field = self._fields.get(goal)
+        if field is not None:
+            self._fields.move_to_end(goal)
+            return field
+
+        field = self._reverse_dijkstra(goal)
+        if field.nbytes <= self.field_budget:
+            self._fields[goal] = field
+            self._evict_fields()
+        return field
+
+    def _evict_fields(self) -> None:
+        # drop least recently used fields until the cache fits in the budget
+        used = sum(field.nbytes for field in self._fields.values())
+        while self._fields and used > self.field_budget:
+            _, field = self._fields.popitem(last=False)
+            used -= field.nbytes
+
+    def _reverse_dijkstra(self, goal: tuple) -> DistanceField:
+        """
+        Dijkstra from the goal over reversed moves: moving from cell v into cell u costs
+        the entering cost of u, so the cost-to-go of v is cost(u) + cost-to-go of u.
+        """
+        step = self._step_costs()
+        width = self.cols + 2
+        inf = float('inf')
+        cost_to_go = [inf] * len(step)
+        direction = [-1] * len(step)
+
+        # (padded offset to the neighbour v, direction from v back to this cell)
+        neighbours = ((-width, 1), (width, 0), (-1, 3), (1, 2))
+
+        target = (goal[0] + 1) * width + goal[1] + 1
+        cost_to_go[target] = 0
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        priority_queue = [(0, target)]
+
+        while priority_queue:
+            current_cost, current = heappop(priority_queue)
+            if current_cost > cost_to_go[current]:
+                continue  # outdated entry
+
+            # going from a neighbour into this cell costs this cell's entering cost
+            enter_cost = step[current]
+            if not enter_cost:
+                continue  # an obstacle (or a blocked goal) cannot be entered
+            new_cost = current_cost + enter_cost
+            for offset, back in neighbours:
+                neighbour = current + offset
+                if step[neighbour] and new_cost < cost_to_go[neighbour]:
+                    cost_to_go[neighbour] = new_cost
+                    direction[neighbour] = back
+                    heappush(priority_queue, (new_cost, neighbour))
+
+        # keep only the real cells, in compact arrays
+        cost = array('d')
+        moves = array('b')
+        for x in range(self.rows):
+            first = (x + 1) * width + 1
+            cost.extend(cost_to_go[first:first + self.cols])
+            moves.extend(direction[first:first + self.cols])
+        return DistanceField(goal, self.rows, self.cols, cost, moves)
+
+    def _update_fields(self, cell, old_code) -> None:
+        """
+        Keep the cached distance fields right after a terrain change.
+        A field is fixed in place when the change cannot alter any other cell's
+        cost-to-go, otherwise it is dropped and made again when next asked for.
+        """
+        if not self._fields:
+            return
+        if cell is None:
+            self._fields.clear()  # the whole terrain was regenerated
+            return
+
+        x, y = cell
+        cols = self.cols
+        index = x * cols + y
+        old_cost = self.costs[old_code]
+        new_cost = self.move_cost(x, y)
+        blocked = self.check_obstacle(x, y)
+        inf = float('inf')
+
+        # neighbours as (flat index, direction from the neighbour into the changed cell)
+        neighbours = []
+        for direction, (d_x, d_y) in enumerate(DIRECTIONS):
+            if self.in_bounds(x - d_x, y - d_y):
+                neighbours.append(((x - d_x) * cols + (y - d_y), direction))
+
+        for goal, field in list(self._fields.items()):
+            cost, step = field.cost, field.step
+            if cell == goal:
+                del self._fields[goal]  # the last step of every path pays the goal's cost
+                continue
+
+            if new_cost > old_cost:
+                # more expensive: only cells whose path enters this cell get worse
+                if any(step[n] == d for n, d in neighbours):
+                    del self._fields[goal]
+                elif blocked:
+                    cost[index] = inf
+                    step[index] = -1
+                continue
+
+            # cheaper: a freed cell first gets its own cost-to-go from its neighbours
+            if old_cost == inf:
+                for n, d in neighbours:
+                    back = d ^ 1  # opposite direction, from the changed cell to n
+                    through = self.costs[self.terrain[n]] + cost[n]
+                    if not self.check_obstacle(*divmod(n, cols)) and through < cost[index]:
+                        cost[index] = through
+                        step[index] = back
+            # then it only matters if a neighbour gets cheaper by entering it
+            if cost[index] < inf and any(new_cost + cost[index] < cost[n]
+                                         for n, _ in neighbours
+                                         if not self.check_obstacle(*divmod(n, cols))):
+                del self._fields[goal]
+
+
+    #--> STEP 12: Save and load maps
+    def save(self, path: str) -> None:
+        """
+        Write the map to a binary file: a small header (size, start, goal, costs),
+        then the terrain codes as they are in memory, then optional sections.
+        The file can be opened again with Map.load().
+        It is written to a temporary file next to path that then replaces path, so a
+        map loaded (and memory-mapped) from path can be saved back to it, and a failed
+        save leaves the old file as it was.
+        """
+        header = MAP_HEADER.pack(MAP_MAGIC, MAP_FORMAT_VERSION, self.rows, self.cols,
+                                 *self.start, *self.goal, *self.costs)
+        handle, temporary = tempfile.mkstemp(prefix=".mapword-", dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(header)
+                # write the terrain in slices, a big map is never copied as a whole
+                cells = memoryview(self.terrain).cast('B')
+                block = 1 << 24
+                for begin in range(0, len(cells), block):
+                    file.write(cells[begin:begin + block])
+                cells.release()
+                for tag, data in self._save_sections():
+                    file.write(MAP_SECTION.pack(tag, len(data)))
+                    file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, region: tuple = None) -> "Map":
+        """
+        Read a map written by Map.save().
+        -mmap: map the terrain of the file into memory instead of reading it. Nothing is
+               read until it is used, and processes that load the same file share the
+               same memory. The mapping is read-only, the first set_terrain() makes a
+               private copy of the terrain, the file is never changed.
+        -region: (top, left, rows, cols) loads only that window of the map, its cells
+                 are (0, 0) to (rows - 1, cols - 1) in the new map. Start and goal are
+                 kept when they are inside the window, otherwise the usual corners are used.
+        """
+        with open(path, 'rb') as file:
+            header = file.read(MAP_HEADER.size)
+            if len(header) < MAP_HEADER.size or not header.startswith(MAP_MAGIC):
+                raise ValueError(f"{path} is not a map file")
+            (_, version, rows, cols, start_x, start_y,
+             goal_x, goal_y, *costs) = MAP_HEADER.unpack(header)
+            if version > MAP_FORMAT_VERSION:
+                raise ValueError(f"{path} uses map format {version}, "
+                                 f"only up to {MAP_FORMAT_VERSION} can be read")
+
+            offset = MAP_HEADER.size
+            size = rows * cols
+            if os.fstat(file.fileno()).st_size < offset + size:
+                raise ValueError(f"{path} is truncated, expected {size} terrain bytes")
+
+            # the whole map, or only a window of it
+            top, left, height, width = (0, 0, rows, cols) if region is None else region
+            if height <= 0 or width <= 0 or top < 0 or left < 0 \
+                    or top + height > rows or left + width > cols:
+                raise IndexError(f"region {region} is outside the {rows}x{cols} map")
+
+            cells = None
+            if mmap and size:
+                cells = memoryview(memory_map.mmap(file.fileno(), 0, access=memory_map.ACCESS_READ))
+
+            if region is None:
+                if cells is not None:
+                    terrain = cells[offset:offset + size]
+                else:
+                    terrain = array('B')
+                    terrain.fromfile(file, size)
+            else:
+                # copy the window row by row, only its rows are ever read from disk
+                terrain = array('B')
+                for x in range(top, top + height):
+                    begin = offset + x * cols + left
+                    if cells is not None:
+                        terrain.frombytes(cells[begin:begin + width])
+                    else:
+                        file.seek(begin)
+                        terrain.fromfile(file, width)
+
+            # optional sections after the terrain
+            sections = {}
+            file.seek(offset + size)
+            while True:
+                section = file.read(MAP_SECTION.size)
+                if len(section) < MAP_SECTION.size:
+                    break
+                tag, length = MAP_SECTION.unpack(section)
+                sections[tag] = file.read(length)
+
+        world = cls(height, width, terrain=terrain)
+        world.set_costs(costs)
+        start = (start_x - top, start_y - left)
+        goal = (goal_x - top, goal_y - left)
+        if world.in_bounds(*start):
+            world.start = start
+        if world.in_bounds(*goal):
+            world.goal = goal
+        if region is None:
+            world._load_sections(sections)
+        return world
+
+    def _save_sections(self) -> list:
+        # (tag, data) of the optional sections written after the terrain
+        sections = []
+        if self._landmarks:
+            if self._landmarks_version != self.version:
+                self.build_landmarks(len(self._landmarks))
+            typecode = self._landmark_tables[0].typecode
+            data = [LANDMARK_HEADER.pack(len(self._landmarks), ord(typecode))]
+            data.extend(LANDMARK_CELL.pack(*cell) for cell in self._landmarks)
+            for table in self._landmark_tables:
+                if sys.byteorder != "little":
+                    table = array(typecode, table)
+                    table.byteswap()
+                data.append(table.tobytes())
+            sections.append((LANDMARK_TAG, b"".join(data)))
+        return sections
+
+    def _load_sections(self, sections: dict) -> None:
+        # read back the optional sections by tag, tags that are not known are skipped
+        data = sections.get(LANDMARK_TAG)
+        if data:
+            count, typecode = LANDMARK_HEADER.unpack_from(data)
+            typecode = chr(typecode)
+            offset = LANDMARK_HEADER.size
+            landmarks = []
+            for _ in range(count):
+                landmarks.append(LANDMARK_CELL.unpack_from(data, offset))
+                offset += LANDMARK_CELL.size
+            tables = []
+            for _ in range(count):
+                table = array(typecode)
+                table.frombytes(data[offset:offset + self.rows * self.cols * table.itemsize])
+                offset += self.rows * self.cols * table.itemsize
+                if sys.byteorder != "little":
+                    table.byteswap()
+                tables.append(table)
+            self._landmarks = landmarks
+            self._landmark_tables = tables
+            self._landmarks_version = self.version
+
+
+    #--> STEP 13: Connectivity index
+    def build_components(self) -> ComponentIndex:
+        """
+        Build the connectivity index (ComponentIndex) of the free cells. From then on
+        a_star() answers unreachable goals without searching and the index is kept
+        up to date as the terrain changes. Returns the index.
+        """
+        if self.components is None:
+            self.components = ComponentIndex(self)
+        return self.components
+
+    def reachable(self, start: tuple = None, goal: tuple = None) -> bool:
+        """
+        True if a path from start to goal (default self.start and self.goal) exists.
+        Builds the connectivity index the first time.
+        """
+        start = tuple(self.start if start is None else start)
+        goal = tuple(self.goal if goal is None else goal)
+        if not self.in_bounds(*start) or not self.in_bounds(*goal):
+            raise IndexError(f"query {start} -> {goal} is outside the {self.rows}x{self.cols} grid")
+        return self.build_components().connected(start, goal)
+
+
+    #--> STEP 14: Anytime A* (ARA*)
+    def anytime_a_star(self, start: tuple = None, goal: tuple = None,
+                       initial_weight: float = 5.0, weight_step: float = 0.5,
+                       time_limit: float = None, max_expansions: int = None):
+        """
+        Anytime Repairing A* (ARA*): find a path fast with a high heuristic weight,
+        then keep improving it by lowering the weight, reusing the previous search.
+        After each lower weight only the cells whose g-score improved are searched
+        again, instead of starting over.
+         -start, goal: default self.start and self.goal
+         -initial_weight: weight of the first, greedy search
+         -weight_step: how much the weight goes down after each search, down to 1
+         -time_limit: seconds after which no new search is started or finished
+         -max_expansions: total number of expanded cells after which it stops
+        Yields (path, bound) every time a cheaper path is found: path as a list of
+        (x, y) and bound so that its cost is at most bound times the cheapest cost.
+        The last one has bound 1.0 (surely the cheapest) unless the time or expansion
+        budget ran out first. Nothing is yielded if the goal cannot be reached.
+        """
+        start = tuple(self.start if start is None else start)
+        goal = tuple(self.goal if goal is None else goal)
+        if not self.in_bounds(*start) or not self.in_bounds(*goal):
+            raise IndexError(f"query {start} -> {goal} is outside the {self.rows}x{self.cols} grid")
+        if initial_weight < 1 or weight_step <= 0:
+            raise ValueError("initial_weight must be at least 1 and weight_step positive")
+        if self.components is not None and not self.components.connected(start, goal):
+            return
+
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        step = self._step_costs()
+        width = self.cols + 2
+        size = len(step)
+        inf = float('inf')
+        offsets = (-width, width, -1, 1)
+
+        # the heuristic has to stay a lower bound for the suboptimality bounds to hold,
+        # so the Manhattan distance is scaled by the cheapest entering cost
+        cheapest = min((cost for cost in step if cost), default=1)
+        goal_row, goal_col = goal[0] + 1, goal[1] + 1
+
+        def h(cell):
+            row, col = divmod(cell, width)
+            return cheapest * (abs(row - goal_row) + abs(col - goal_col))
+
+        source = (start[0] + 1) * width + start[1] + 1
+        target = goal_row * width + goal_col
+
+        g = [inf] * size
+        parent = [-1] * size
+        closed = [0] * size   # search number in which a cell was expanded
+        g[source] = 0
+        weight = initial_weight
+        open_list = [(weight * h(source), source)]   # (f, cell), outdated entries are skipped
+        incons = set()        # cells improved after they were expanded in the current search
+        expansions = 0
+        best_cost = inf
+        last_bound = None
+        search = 0
+
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        while True:
+            search += 1
+
+            #--> improve the path with the current weight
+            out_of_budget = False
+            while open_list:
+                f, current = open_list[0]
+                if closed[current] == search or f != g[current] + weight * h(current):
+                    heappop(open_list)  # expanded already, or g improved since the push
+                    continue
+                if g[target] <= f:
+                    break  # nothing left in the open list can give a cheaper goal
+                if (max_expansions is not None and expansions >= max_expansions) or \
+                        (deadline is not None and expansions % 256 == 0
+                         and time.perf_counter() > deadline):
+                    out_of_budget = True
+                    break
+
+                heappop(open_list)
+                closed[current] = search
+                expansions += 1
+                current_g = g[current]
+                for offset in offsets:
+                    neighbour = current + offset
+                    cost = step[neighbour]
+                    if cost and current_g + cost < g[neighbour]:
+                        g[neighbour] = current_g + cost
+                        parent[neighbour] = current
+                        if closed[neighbour] == search:
+                            incons.add(neighbour)  # expanded in this search, wait for the next one
+                        else:
+                            heappush(open_list, (g[neighbour] + weight * h(neighbour), neighbour))
+
+            if out_of_budget or g[target] == inf:
+                return  # out of budget, or the goal cannot be reached
+
+            # the cheapest cost is at least the smallest g + h of a cell still waiting
+            waiting = min([g[cell] + h(cell) for _, cell in open_list if g[cell] < inf]
+                          + [g[cell] + h(cell) for cell in incons], default=inf)
+            bound = min(weight, g[target] / waiting) if waiting else 1.0
+            bound = max(bound, 1.0)
+
+            if g[target] < best_cost or (bound == 1.0 and last_bound != 1.0):
+                best_cost = g[target]
+                last_bound = bound
+                path = []
+                current = target
+                while current != -1:
+                    row, col = divmod(current, width)
+                    path.append((row - 1, col - 1))
+                    current = parent[current]
+                path.reverse()
+                yield path, bound
+
+            if bound <= 1.0 or weight <= 1.0:
+                return
+            if deadline is not None and time.perf_counter() > deadline:
+                return
+
+            #--> lower the weight, reuse the open cells and the ones improved meanwhile
+            weight = max(1.0, weight - weight_step)
+            cells = {cell for _, cell in open_list} | incons
+            incons = set()
+            open_list = [(g[cell] + weight * h(cell), cell) for cell in cells]
+            heapq.heapify(open_list)
+
+
+    #--> STEP 15: Path cache
+    def cache_paths(self, maxsize: int = 1024) -> None:
+        """
+        Keep the results of up to maxsize a_star() queries, so asking the same
+        (start, goal, weight) again returns the saved path. Least recently used
+        results are dropped first, maxsize=0 turns the cache off.
+        Changes made with set_terrain() only drop the results they can affect: a cell
+        that got more expensive only the paths through it, a cell that got cheaper only
+        the paths that a route through it could beat. Writing to Map.terrain directly
+        is not seen by the cache.
+        """
+        if maxsize < 0:
+            raise ValueError("maxsize must not be negative")
+        self._path_cache_size = maxsize
+        if not maxsize:
+            self._paths = None
+            return
+        if self._paths is None:
+            self._paths = OrderedDict()
+        while len(self._paths) > maxsize:
+            self._paths.popitem(last=False)
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Hits, misses, maximum and current size of the path cache, like functools.lru_cache.
+        """
+        currsize = 0 if self._paths is None else len(self._paths)
+        return CacheInfo(self._path_hits, self._path_misses, self._path_cache_size, currsize)
+
+    def cache_clear(self) -> None:
+        """
+        Drop every cached path and reset the hit and miss counts.
+        """
+        if self._paths is not None:
+            self._paths.clear()
+        self._path_hits = self._path_misses = 0
+
+    def _store_path(self, key: tuple, path: list) -> None:
+        # entry: (path as a tuple, its cost, its cells, terrain version it is right for)
+        if path is None:
+            entry = (None, float('inf'), frozenset(), self.version)
+        else:
+            cost = sum(self.move_cost(x, y) for x, y in path[1:])
+            entry = (tuple(path), cost, frozenset(path[1:]), self.version)
+        self._paths[key] = entry
+        self._paths.move_to_end(key)
+        while len(self._paths) > self._path_cache_size:
+            self._paths.popitem(last=False)
+
+    def _update_paths(self, cell, old_code) -> None:
+        """
+        Drop the cached paths a terrain change can affect, and mark the others as
+        still right for the new terrain version.
+        """
+        if not self._paths:
+            return
+        if cell is None:
+            self._paths.clear()  # the whole terrain was regenerated
+            return
+
+        x, y = cell
+        old_cost = self.costs[old_code]
+        new_cost = self.move_cost(x, y)
+        inf = float('inf')
+        cheapest = min((cost for cost in self.costs if cost != inf), default=1)
+
+        for key, (path, cost, cells, version) in list(self._paths.items()):
+            start, goal = key[0], key[1]
+            if version != self.version - 1:
+                del self._paths[key]  # missed a change, cannot be trusted
+                continue
+            if cell == start:
+                pass  # the start is never entered, paths from it do not change
+            elif new_cost > old_cost:
+                # more expensive: only a path through the cell costs more now,
+                # every other route only got dearer, so the others stay best
+                if cell in cells:
+                    del self._paths[key]
+                    continue
+            elif path is None:
+                # unreachable stays unreachable unless an obstacle was removed
+                if old_cost == inf:
+                    del self._paths[key]
+                    continue
+            else:
+                # cheaper: the cheapest route through the cell costs at least this,
+                # if that cannot beat the cached path nothing changes
+                through = (cheapest * (abs(start[0] - x) + abs(start[1] - y) - 1) + new_cost
+                           + cheapest * (abs(goal[0] - x) + abs(goal[1] - y)))
+                if cell in cells or through < cost:
+                    del self._paths[key]
+                    continue
+            self._paths[key] = (path, cost, cells, self.version)
+
+
+    #--> STEP 17: Landmark (ALT) heuristic
+    def build_landmarks(self, count: int = 8) -> list:
+        """
+        Pick count landmarks and store the cost from every cell to each of them, so
+        the flat A* engine can use the ALT heuristic instead of the Manhattan distance.
+        The Manhattan distance counts every step as the cheapest terrain, on maps with
+        many hills and water it is far below the real cost and A* expands many cells
+        it does not need. The triangle inequality over the landmark costs gives a much
+        closer estimate that still never overestimates, so paths stay the cheapest.
+        Landmarks are picked far apart: each new one is the cell farthest from all the
+        ones picked before. Tables are array('I') (array('d') when a terrain cost is not
+        a whole number), 4 bytes per cell and landmark.
+        When a cell gets dearer (an obstacle is added, say) the tables are kept: costs
+        only grew, so the old ones are still lower bounds, if looser ones. When a cell
+        gets cheaper, or the terrain is regenerated, they are made again, lazily, on
+        the next search. The tables are saved with the map by save().
+        Returns the landmark cells.
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        inf = float('inf')
+        whole = all(float(cost).is_integer() for cost in self.costs if cost != inf)
+
+        # start from the first free cell, row after row
+        first = next((index for index, code in enumerate(self.terrain)
+                      if self.costs[code] != inf), None)
+        landmarks = []
+        tables = []
+        if first is not None:
+            landmark = divmod(first, self.cols)
+            nearest = None  # cost from every cell to its closest landmark so far
+            while len(landmarks) < count:
+                cost = self._reverse_dijkstra(landmark).cost
+                landmarks.append(landmark)
+                if whole:
+                    tables.append(array('I', [UNREACHABLE if value == inf else int(value)
+                                              for value in cost]))
+                else:
+                    tables.append(cost)
+
+                # next landmark: the reachable cell farthest from every landmark so far
+                nearest = cost if nearest is None else array('d', map(min, nearest, cost))
+                farthest = max((value for value in nearest if value != inf), default=0)
+                if not farthest:
+                    break  # every reachable cell is a landmark already
+                landmark = divmod(nearest.index(farthest), self.cols)
+
+        self._landmarks = landmarks
+        self._landmark_tables = tables
+        self._landmarks_version = self.version
+        return list(landmarks)
+
+    def _update_landmarks(self, cell, old_code) -> None:
+        # tables right for the terrain before this change stay right after a cost increase
+        if self._landmarks is None or cell is None or self._landmarks_version != self.version - 1:
+            return
+        if self.move_cost(*cell) >= self.costs[old_code]:
+            self._landmarks_version = self.version
+
+    def _landmark_heuristic(self, goal: tuple):
+        """
+        Return h(padded index), a lower bound on the cost from a cell n to goal.
+        With r(v) the cost from v to landmark L and c(v) the cost of entering v,
+        the cost from L to v is r(v) + c(v) - c(L) (the same path the other way
+        round pays for the other end), so the triangle inequality gives
+          cost(n, goal) >= r(n) - r(goal)                   (n -> goal -> L)
+          cost(n, goal) >= r(goal) + c(goal) - r(n) - c(n)  (L -> n -> goal)
+        h is the biggest of these over all landmarks and the Manhattan distance.
+        Tables kept from before a cost increase still give lower bounds: r(n) - r(goal)
+        is bounded by the old cost from n to goal, and the second bound uses today's
+        c(goal), which every path to the goal pays, and today's c(n), which only grew.
+        """
+        if self._landmarks_version != self.version:
+            self.build_landmarks(len(self._landmarks) or 1)  # the terrain changed since
+
+        step = self._step_costs()
+        width = self.cols + 2
+        cols = self.cols
+        inf = float('inf')
+        goal_row, goal_col = goal[0] + 1, goal[1] + 1
+        cheapest = min((cost for cost in self._code_steps() if cost), default=1)
+        goal_index = goal[0] * cols + goal[1]
+        goal_cost = step[goal_row * width + goal_col]
+
+        # (table, r(goal), r(goal) + c(goal)) of the landmarks the goal can reach
+        terms = []
+        for table in self._landmark_tables:
+            to_landmark = table[goal_index]
+            if to_landmark != UNREACHABLE and to_landmark != inf:
+                terms.append((table, to_landmark, to_landmark + goal_cost))
+
+        def heuristic(cell: int):
+            row, col = divmod(cell, width)
+            best = cheapest * (abs(row - goal_row) + abs(col - goal_col))
+            index = (row - 1) * cols + col - 1
+            for table, goal_to_landmark, through_goal in terms:
+                to_landmark = table[index]
+                if to_landmark == UNREACHABLE or to_landmark == inf:
+                    return inf  # the goal reaches L and this cell does not, so it cannot reach the goal
+                if to_landmark - goal_to_landmark > best:
+                    best = to_landmark - goal_to_landmark
+                from_landmark = through_goal - to_landmark - step[cell]
+                if from_landmark > best:
+                    best = from_landmark
+            return best
+
+        return heuristic
+
+
+    #--> STEP 19: Cheapest of many goals
+    def nearest_goal(self, goals, weight: float = 1.0, start: tuple = None) -> tuple:
+        """
+        Find the cheapest path from start (default self.start) to any one of goals,
+        with one search instead of one a_star() per goal.
+        The heuristic of a cell is the Manhattan distance to its closest goal (times
+        the cheapest terrain cost), so it stays a lower bound and with weight <= 1
+        the first goal taken from the open list is the cheapest one to reach.
+        With many goals the closest one is found through buckets of goals (_GoalIndex).
+        Obstacle goals cannot be entered and are skipped, and when the connectivity
+        index is built (build_components()) so are goals the start cannot reach.
+        Returns (path, goal), path as a list of (x, y), or (None, None) if no goal
+        can be reached.
+        """
+        start = tuple(self.start if start is None else start)
+        if not self.in_bounds(*start):
+            raise IndexError(f"start {start} is outside the {self.rows}x{self.cols} grid")
+        goals = {tuple(goal) for goal in goals}
+        for goal in goals:
+            if not self.in_bounds(*goal):
+                raise IndexError(f"goal {goal} is outside the {self.rows}x{self.cols} grid")
+        if start in goals:
+            return [start], start
+        goals = {goal for goal in goals if not self.check_obstacle(*goal)}
+        if self.components is not None:
+            goals = {goal for goal in goals if self.components.connected(start, goal)}
+        if not goals:
+            return None, None
+
+        step = self._step_costs()
+        width = self.cols + 2
+        inf = float('inf')
+        cheapest = min((cost for cost in self.costs if cost != inf), default=1)
+
+        if len(goals) <= 16:
+            goal_list = list(goals)
+
+            def heuristic(x, y):
+                return min(abs(goal_x - x) + abs(goal_y - y) for goal_x, goal_y in goal_list)
+        else:
+            # buckets about as wide as the goals are apart, if they were spread evenly
+            size = max(4, int((self.rows * self.cols / len(goals)) ** 0.5))
+            heuristic = _GoalIndex(goals, size).distance
+
+        # reuse the arrays of the flat engine (see STEP 9b)
+        size = len(step)
+        if len(self._g) < size:
+            self._g = [0] * size
+            self._parent = [-1] * size
+            self._seen = [0] * size
+        g = self._g
+        parent = self._parent
+        seen = self._seen
+        self._generation += 1
+        generation = self._generation
+
+        targets = {(x + 1) * width + y + 1 for x, y in goals}
+        source = (start[0] + 1) * width + start[1] + 1
+        g[source] = 0
+        parent[source] = -1
+        seen[source] = generation
+
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        priority_queue = [(0, source, 0)]
+        while priority_queue:
+            _, current, current_g = heappop(priority_queue)
+            if current_g > g[current]:
+                continue  # outdated entry
+
+            if current in targets:
+                row, col = divmod(current, width)
+                return self._flat_path(current, generation), (row - 1, col - 1)
+
+            for offset in (-width, width, -1, 1):
+                neighbour = current + offset
+                cost = step[neighbour]
+                if not cost:
+                    continue  # obstacle or border
+
+                new_cost = current_g + cost
+                if seen[neighbour] != generation or new_cost < g[neighbour]:
+                    seen[neighbour] = generation
+                    g[neighbour] = new_cost
+                    parent[neighbour] = current
+
+                    row, col = divmod(neighbour, width)
+                    priority = new_cost + weight * cheapest * heuristic(row - 1, col - 1)
+                    heappush(priority_queue, (priority, neighbour, new_cost))
+
+        return None, None
+
+
+    #--> STEP 21: Whole-map cost fields with NumPy
+    def cost_field(self, source: tuple = None) -> CostField:
+        """
+        Cost from source (default self.start) to every cell, as a CostField, for
+        coverage planning or heatmaps. Needs NumPy, which is only imported here.
+        Instead of a Dijkstra search cell by cell, whole rows and columns are relaxed
+        at once (fast sweeping): a sweep from left to right sets every cell to the
+        cheapest of its own cost and "any cell to its left + the costs entered on the
+        way", for all rows in one go. With S the running sum of entering costs along
+        the row this is
+            cost[j] = S[j] + min over k <= j of (cost[k] - S[k])
+        which is a cumulative sum and a cumulative minimum. Sweeps in the four
+        directions are repeated until nothing changes, which takes about as many
+        rounds as the cheapest paths have turns.
+        The sums are done in 64-bit integers, so the result is exactly Dijkstra's;
+        for that every terrain cost must be a whole number. Obstacles get a cost
+        higher than any real path, so a cost at least that high means unreachable.
+        When to use distance_field() instead: distance_field(source) holds the same
+        costs, the cost from a free source to v is its value at v + c(v) - c(source),
+        with c the entering cost. Its Dijkstra search does not depend on how often the
+        paths turn, so it is the faster one on mixed terrain: on the default 65/15/10/10
+        map of 500x500 the sweeps take about 3 times as long. cost_field() pays off on
+        open, mostly uniform maps (mostly normal terrain, few hills and water), where
+        the sweeps are done in a few rounds, 2 to 10 times faster there.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("cost_field() needs NumPy (pip install numpy)") from None
+
+        source = tuple(self.start if source is None else source)
+        if not self.in_bounds(*source):
+            raise IndexError(f"source {source} is outside the {self.rows}x{self.cols} grid")
+        inf = float('inf')
+        if not all(float(cost).is_integer() for cost in self.costs if cost != inf):
+            raise ValueError("cost_field() needs whole-number terrain costs, use distance_field() instead")
+
+        # entering cost of every cell; obstacles cost more than the dearest path without them
+        codes = np.frombuffer(bytes(self.terrain), dtype=np.uint8).reshape(self.rows, self.cols)
+        free_costs = [int(cost) for cost in self.costs if cost != inf]
+        blocked = (max(free_costs, default=1) * self.rows * self.cols) + 1
+        table = np.array([blocked if cost == inf else int(cost) for cost in self.costs], dtype=np.int64)
+        enter = table[codes]
+
+        # far above any sum a sweep can add, clipped back after every sweep
+        unknown = np.int64(1) << 60
+        cost = np.full((self.rows, self.cols), unknown, dtype=np.int64)
+        cost[source] = 0
+
+        # the running sums of entering costs never change, make them once per direction
+        rightward = np.cumsum(enter, axis=1)
+        leftward = np.cumsum(enter[:, ::-1], axis=1)
+        downward = np.cumsum(enter, axis=0)
+        upward = np.cumsum(enter[::-1], axis=0)
+
+        def sweep(field, running, axis):
+            relaxed = running + np.minimum.accumulate(field - running, axis=axis)
+            np.minimum(relaxed, unknown, out=relaxed)
+            return relaxed
+
+        while True:
+            before = cost
+            cost = sweep(cost, rightward, 1)                        # left to right
+            cost = sweep(cost[:, ::-1], leftward, 1)[:, ::-1]       # right to left
+            cost = sweep(cost, downward, 0)                         # top to bottom
+            cost = sweep(cost[::-1], upward, 0)[::-1]               # bottom to top
+            if np.array_equal(cost, before):
+                break
+
+        field = cost.astype(np.float64)
+        field[cost >= blocked] = inf
+        enter_cost = enter.astype(np.float64)
+        enter_cost[enter >= blocked] = inf
+        return CostField(source, field, enter_cost)
+
+
+# Worker side of Map.solve_many(). Each worker process builds its own Map on top of
+# the shared terrain once, then answers queries with the flat-index engine.
+_worker_memory = None
+_worker_map = None
+
+
+def _attach_worker(memory_name: str, rows: int, cols: int, costs: list) -> None:
+    global _worker_memory, _worker_map
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_map = Map(rows, cols, terrain=_worker_memory.buf[:rows * cols])
+    _worker_map.set_costs(costs)
+
+
+def _solve_query(query: tuple) -> tuple:
+    start, goal, weight = query
+    return start, goal, _worker_map._flat_a_star(start, goal, weight)
@@ -0,0 +1,357 @@
+"""
+Planning Service
+----------------
+
+An asyncio server that answers path requests for many robots at once. Maps are
+loaded once; searches run in a bounded pool of worker processes (or threads) so
+the event loop is never blocked by a search.
+
+Protocol: newline-delimited JSON over localhost TCP or a Unix socket. Every request
+is one JSON object on one line, every response too, with the request's "id":
+    {"id": 1, "op": "path", "map": "yard", "start": [0, 0], "goal": [9, 9], "weight": 1}
+    -> {"id": 1, "ok": true, "path": [[0, 0], ...], "cost": 18, "version": 0}
+    {"id": 2, "op": "block", "map": "yard", "cell": [4, 5]}
+    -> {"id": 2, "ok": true, "version": 1}
+    {"id": 3, "op": "set_terrain", "map": "yard", "cell": [4, 5], "terrain": "N"}
+    {"id": 4, "op": "stats"}
+    -> {"id": 4, "ok": true, "requests": ..., "latency_ms": {"p50": ..., "p90": ..., "p99": ...}, ...}
+Errors are answered as {"id": ..., "ok": false, "error": "..."}.
+
+Identical path requests that arrive while one is being searched share its result.
+At most max_pending requests are handled at a time; after that the server stops
+reading from the connections until one finishes, so clients are slowed down
+(backpressure) instead of the queue growing without limit.
+
+Usage:
+    python service.py --map yard=yard.map --tcp 127.0.0.1:8765
+    python service.py --map yard=yard.map --unix /tmp/planner.sock --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+from mapword import Map
+
+# Worker side. Every worker (process or thread) builds its own Map over the shared
+# terrain of each map, the first time it needs it: Map objects keep search arrays
+# and cannot be shared by two searches running at the same time.
+_terrains = {}            # map name -> (terrain buffer, rows, cols, costs)
+_memories = []            # shared memory blocks attached by a worker process
+_local = threading.local()
+
+
+def _attach_maps(maps: dict) -> None:
+    # process pool initializer: maps is name -> (shared memory name, rows, cols, costs)
+    for name, (memory_name, rows, cols, costs) in maps.items():
+        memory = shared_memory.SharedMemory(name=memory_name)
+        _memories.append(memory)
+        _terrains[name] = (memory.buf[:rows * cols], rows, cols, costs)
+
+
+def _plan(name: str, version: int, start: tuple, goal: tuple, weight: float) -> tuple:
+    worlds = getattr(_local, "worlds", None)
+    if worlds is None:
+        worlds = _local.worlds = {}
+    world = worlds.get(name)
+    if world is None:
+        terrain, rows, cols, costs = _terrains[name]
+        world = worlds[name] = Map(rows, cols, terrain=terrain)
+        world.set_costs(costs)
+    # the service changes the shared terrain directly, moving to its version makes
+    # this Map build its step costs again (see Map._step_costs)
+    world.version = version
+
+    path = world._flat_a_star(start, goal, weight)
+    cost = None if path is None else sum(world.move_cost(x, y) for x, y in path[1:])
+    return path, cost
+
+
+class _MapEntry:
+    """
+    One map served by the service, with the bookkeeping that keeps terrain updates
+    from changing the terrain under a running search.
+    """
+
+    def __init__(self, world: Map, memory=None) -> None:
+        self.world = world
+        self.memory = memory
+        self.running = 0       # searches running on this map
+        self.writing = 0       # terrain updates waiting, new searches wait for them
+        self.changed = asyncio.Condition()
+
+
+class PlanningService:
+    """
+    Serves path requests for a set of named maps.
+     -maps: dict of name -> Map
+     -workers: size of the worker pool (default: number of cores)
+     -threads: use a thread pool instead of processes (no shared memory needed,
+               but searches then share the interpreter lock)
+     -max_pending: requests handled at the same time before backpressure starts
+     -latency_window: number of recent requests the latency percentiles are taken over
+    """
+
+    def __init__(self, maps: dict, workers: int = None, threads: bool = False,
+                 max_pending: int = 256, latency_window: int = 10000) -> None:
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.max_pending = max_pending
+        self._maps = {}
+        self._source_maps = maps
+
+        self._pool = None
+        self._pending = None
+        self._in_flight = {}    # (map, start, goal, weight, version) -> future of the search
+        self._latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    #--> Starting and stopping
+    async def start(self) -> None:
+        """
+        Start the worker pool. For processes the terrain of every map is moved into
+        shared memory first, so workers read it without copies and see updates.
+        """
+        self._pending = asyncio.Semaphore(self.max_pending)
+        if self.threads:
+            for name, world in self._source_maps.items():
+                self._maps[name] = _MapEntry(world)
+                _terrains[name] = (world.terrain, world.rows, world.cols, list(world.costs))
+            self._pool = ThreadPoolExecutor(self.workers)
+            return
+
+        shared = {}
+        for name, world in self._source_maps.items():
+            size = world.rows * world.cols
+            memory = shared_memory.SharedMemory(create=True, size=max(1, size))
+            memory.buf[:size] = bytes(world.terrain)
+            # the service's Map now writes its terrain changes straight into shared memory
+            world.terrain = memory.buf[:size]
+            self._maps[name] = _MapEntry(world, memory)
+            shared[name] = (memory.name, world.rows, world.cols, list(world.costs))
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_attach_maps, initargs=(shared,))
+
+    def close(self) -> None:
+        """
+        Stop the worker pool and free the shared memory.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        for entry in self._maps.values():
+            if entry.memory is not None:
+                # give the Map its own copy back before the shared block goes away
+                world = entry.world
+                terrain = array('B')
+                terrain.frombytes(world.terrain)
+                world.terrain.release()
+                world.terrain = terrain
+                entry.memory.close()
+                entry.memory.unlink()
+        self._maps.clear()
+
+    async def serve_tcp(self, host: str = "127.0.0.1", port: int = 8765):
+        await self.start()
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def serve_unix(self, path: str):
+        await self.start()
+        return await asyncio.start_unix_server(self._handle_client, path)
+
+    #--> Requests
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tasks = set()
+        try:
+            while True:
+                # backpressure: no new line is read while max_pending requests are running
+                await self._pending.acquire()
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    line = b""  # a line over the stream limit or a reset connection ends the client
+                except BaseException:
+                    self._pending.release()
+                    raise
+                if not line:
+                    self._pending.release()
+                    break
+                task = asyncio.create_task(self._answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def _answer(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        began = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            response = await self.handle(request)
+            response["ok"] = True
+        except Exception as error:  # every failure goes back to the client
+            self.errors += 1
+            response = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+        finally:
+            self._pending.release()
+        response["id"] = request_id
+        self._latencies.append(time.perf_counter() - began)
+        self.requests += 1
+
+        writer.write((json.dumps(response) + "\n").encode())
+        await writer.drain()
+
+    async def handle(self, request: dict) -> dict:
+        """
+        Answer one request (a decoded JSON object), see the module docstring.
+        """
+        op = request.get("op", "path")
+        if op == "path":
+            return await self.find_path(request["map"], request["start"], request["goal"],
+                                        request.get("weight", 1.0))
+        if op == "block":
+            return await self.set_terrain(request["map"], request["cell"], 'O')
+        if op == "set_terrain":
+            return await self.set_terrain(request["map"], request["cell"], request["terrain"])
+        if op == "stats":
+            return self.stats()
+        raise ValueError(f"unknown op {op!r}")
+
+    def _entry(self, name: str) -> _MapEntry:
+        entry = self._maps.get(name)
+        if entry is None:
+            raise KeyError(f"no map named {name!r}")
+        return entry
+
+    async def find_path(self, name: str, start, goal, weight: float = 1.0) -> dict:
+        entry = self._entry(name)
+        world = entry.world
+        start, goal = tuple(start), tuple(goal)
+        if not world.in_bounds(*start) or not world.in_bounds(*goal):
+            raise IndexError(f"query {start} -> {goal} is outside the {world.rows}x{world.cols} grid")
+
+        async with entry.changed:
+            await entry.changed.wait_for(lambda: not entry.writing)
+            entry.running += 1
+        try:
+            version = world.version
+            key = (name, start, goal, weight, version)
+            future = self._in_flight.get(key)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self._pool, _plan, name, version, start, goal, weight)
+                self._in_flight[key] = future
+                future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            else:
+                self.coalesced += 1  # the same search is running already, share its result
+            path, cost = await asyncio.shield(future)
+        finally:
+            async with entry.changed:
+                entry.running -= 1
+                entry.changed.notify_all()
+        return {"path": path, "cost": cost, "version": version}
+
+    async def set_terrain(self, name: str, cell, terrain) -> dict:
+        """
+        Change one cell, like adding an obstacle in main.py: the cell must be on the
+        map and an obstacle cannot be put on the map's start or goal.
+        Waits for the searches running on the map, so none sees half an update.
+        """
+        entry = self._entry(name)
+        world = entry.world
+        x, y = cell
+        if not world.in_bounds(x, y):
+            raise IndexError(f"cell {(x, y)} is outside the {world.rows}x{world.cols} grid")
+        if terrain in ('O', 3) and (x, y) in (world.start, world.goal):
+            raise ValueError("cannot place an obstacle on start or goal")
+
+        async with entry.changed:
+            entry.writing += 1
+            try:
+                await entry.changed.wait_for(lambda: not entry.running)
+                world.set_terrain(x, y, terrain)
+            finally:
+                entry.writing -= 1
+                entry.changed.notify_all()
+        return {"version": world.version}
+
+    def stats(self) -> dict:
+        """
+        Request counts and latency percentiles (in milliseconds) of recent requests.
+        """
+        latencies = sorted(self._latencies)
+
+        def percentile(share):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(share * len(latencies)))] * 1000
+
+        return {"requests": self.requests, "coalesced": self.coalesced, "errors": self.errors,
+                "in_flight": len(self._in_flight), "workers": self.workers,
+                "latency_ms": {"p50": percentile(0.50), "p90": percentile(0.90),
+                               "p99": percentile(0.99), "max": percentile(1.0)}}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve path requests as newline-delimited JSON.")
+    parser.add_argument("--map", action="append", default=[], metavar="NAME=FILE",
+                        help="map file written by Map.save(), can be repeated")
+    parser.add_argument("--size", type=int, default=100,
+                        help="size of the random map 'default' used when no --map is given")
+    parser.add_argument("--seed", type=int, help="seed of that random map")
+    parser.add_argument("--tcp", default="127.0.0.1:8765", metavar="HOST:PORT")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, help="worker pool size (default: number of cores)")
+    parser.add_argument("--threads", action="store_true", help="use threads instead of processes")
+    parser.add_argument("--max-pending", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    maps = {}
+    for item in args.map:
+        name, _, path = item.partition("=")
+        if not path:
+            parser.error(f"--map expects NAME=FILE, got {item!r}")
+        maps[name] = Map.load(path, mmap=False)
+    if not maps:
+        world = Map(args.size, args.size)
+        world.fill_random_grid(seed=args.seed)
+        maps["default"] = world
+
+    service = PlanningService(maps, args.workers, args.threads, args.max_pending)
+
+    async def run():
+        if args.unix:
+            server = await service.serve_unix(args.unix)
+        else:
+            host, _, port = args.tcp.rpartition(":")
+            server = await service.serve_tcp(host or "127.0.0.1", int(port))
+        where = ", ".join(str(socket.getsockname()) for socket in server.sockets)
+        print(f"serving {', '.join(maps)} on {where}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+IncrementalPlanner against a plain Dijkstra search, after random terrain edits
+and robot moves.
+"""
+
+import heapq
+import random
+import unittest
+
+from incremental import IncrementalPlanner
+from mapword import Map, TERRAIN_SYMBOLS
+
+INF = float('inf')
+
+
+def reference_cost(world: Map, start: tuple, goal: tuple) -> float:
+    # Dijkstra with the cost paid when entering a cell; the start may be blocked
+    best = {start: 0}
+    queue = [(0, start)]
+    while queue:
+        cost, cell = heapq.heappop(queue)
+        if cell == goal:
+            return cost
+        if cost > best[cell]:
+            continue
+        for neighbour in world.find_moves(*cell):
+            new_cost = cost + world.move_cost(*neighbour)
+            if new_cost < best.get(neighbour, INF):
+                best[neighbour] = new_cost
+                heapq.heappush(queue, (new_cost, neighbour))
+    return INF
+
+
+class IncrementalPlannerTest(unittest.TestCase):
+
+    def check(self, planner: IncrementalPlanner) -> None:
+        world = planner.world
+        expected = reference_cost(world, planner.start, planner.goal)
+        path = planner.replan()
+        self.assertEqual(planner.cost, expected)
+        if expected == INF:
+            self.assertIsNone(path)
+            return
+        self.assertEqual(path[0], planner.start)
+        self.assertEqual(path[-1], planner.goal)
+        self.assertEqual(sum(world.move_cost(x, y) for x, y in path[1:]), expected)
+
+    def test_blocked_goal(self):
+        world = Map(3, 3)
+        world.set_terrain(2, 2, 'O')
+        planner = IncrementalPlanner(world)
+        self.assertIsNone(planner.replan())
+        self.assertEqual(planner.cost, INF)
+
+    def test_goal_freed_after_start_left_it(self):
+        world = Map(3, 3)
+        world.start = world.goal = (1, 1)
+        planner = IncrementalPlanner(world)
+        self.check(planner)
+        planner.block(1, 1)
+        planner.move_to(0, 0)
+        self.check(planner)
+        planner.set_terrain(1, 1, 'N')
+        self.check(planner)
+
+    def test_random_edits_and_moves(self):
+        rng = random.Random(7)
+        for seed in range(60):
+            rows, cols = rng.randint(1, 12), rng.randint(1, 12)
+            world = Map(rows, cols)
+            world.fill_random_grid(55, 15, 10, 20, seed=seed)
+            world.start = (rng.randrange(rows), rng.randrange(cols))
+            world.goal = (rng.randrange(rows), rng.randrange(cols))
+            planner = IncrementalPlanner(world)
+            self.check(planner)
+            for _ in range(25):
+                if rng.random() < 0.25:
+                    planner.move_to(rng.randrange(rows), rng.randrange(cols))
+                else:
+                    cell = (rng.randrange(rows), rng.randrange(cols))
+                    # edits near the goal and start are the ones most likely to go wrong
+                    if rng.random() < 0.2:
+                        cell = rng.choice((planner.goal, planner.start))
+                    planner.set_terrain(*cell, rng.choice(TERRAIN_SYMBOLS))
+                self.check(planner)
+            planner.close()
+
+
+if __name__ == "__main__":
+    unittest.main()